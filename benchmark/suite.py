@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading as th
+import time
+from pathlib import Path
+from typing import Any, Optional
+import cv2
+import numpy as np
+import PIL
+from PIL import Image
+
+from runtime.frame_quantizer import FrameQuantizer
+from runtime.gif_converter import GIFConverter, WithVideoCapture
+from runtime.pipeline_tracer import PipelineTracer
+from runtime.worker_tuner import WorkerTuner
+
+
+# 合成動画の種類
+CLIP_KINDS = ("screencast", "noise", "gradient")
+
+# 合成動画の解像度とフレーム数
+CLIP_SIZES = ((320, 180), (640, 360), (1280, 720))
+CLIP_FRAMES = (30, 120)
+CLIP_FPS = 30.0
+
+# 設定の組み合わせ(名前とGIFConverter.exportへ渡す設定)
+SETTINGS = {
+    "mediancut": {"resize": 1.0, "quantize_method": int(Image.Quantize.MEDIANCUT)},
+    "mediancut-half": {"resize": 0.5, "quantize_method": int(Image.Quantize.MEDIANCUT)},
+    "fastoctree": {"resize": 1.0, "quantize_method": int(Image.Quantize.FASTOCTREE)},
+    "kmeans": {"resize": 1.0, "quantize_method": FrameQuantizer.MINIBATCH_KMEANS},
+    "global-palette": {"resize": 1.0, "quantize_method": int(Image.Quantize.MEDIANCUT), "global_palette": True},
+}
+
+# ワーカー数の組み合わせ
+WORKERS = (1, GIFConverter.AUTO_WORKERS)
+
+# 処理速度、出力サイズの悪化とみなす割合
+REGRESSION_THRESHOLD = 0.1
+
+
+def create_clip(path:Path, kind:str, width:int, height:int, frames:int, fps:float=CLIP_FPS) -> None:
+    """決定的な合成動画の作成
+
+    Args:
+        path (Path): 動画の出力パス
+        kind (str): 合成動画の種類(screencast: ほぼ静止した画面とカーソル、noise: 毎フレーム変わるノイズ、gradient: 流れるグラデーション)
+        width (int): 横幅
+        height (int): 縦幅
+        frames (int): フレーム数
+        fps (float, optional): フレームレート. Defaults to CLIP_FPS.
+    """
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    try:
+        if kind == "screencast":
+            # ウィンドウ風の矩形と文字を並べた背景
+            background = np.full((height, width, 3), 236, dtype=np.uint8)
+            for _ in range(12):
+                x, y = rng.integers(0, width), rng.integers(0, height)
+                color = tuple(int(value) for value in rng.integers(0, 256, 3))
+                cv2.rectangle(background, (int(x), int(y)), (int(x + width // 4), int(y + height // 6)), color, -1)
+            for line in range(0, height, max(12, height // 20)):
+                cv2.putText(background, f"line {line:04d} lorem ipsum", (8, line + 10), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (32, 32, 32), 1)
+
+        yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+        for frame in range(frames):
+            if kind == "screencast":
+                image = background.copy()
+                cursor = (int(width * (0.2 + 0.6 * frame / max(1, frames))), int(height * 0.5))
+                cv2.circle(image, cursor, max(3, width // 80), (0, 0, 255), -1)
+            elif kind == "noise":
+                image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            elif kind == "gradient":
+                phase = frame / max(1, frames) * 2.0 * np.pi
+                image = np.stack([
+                    127.5 + 127.5 * np.sin(xx / width * 4.0 + phase),
+                    127.5 + 127.5 * np.sin(yy / height * 3.0 - phase),
+                    127.5 + 127.5 * np.sin((xx + yy) / (width + height) * 5.0 + phase * 0.5),
+                ], axis=2).astype(np.uint8)
+            else:
+                raise ValueError(f"unknown clip kind: {kind}")
+            writer.write(image)
+    finally:
+        writer.release()
+
+
+def create_clips(directory:Path, kinds:list[str], sizes:list[tuple[int, int]], frames_list:list[int]) -> list[Path]:
+    """合成動画の一覧を作成
+
+    作成済みの動画は使い回します。
+
+    Args:
+        directory (Path): 動画の保存先
+        kinds (list[str]): 合成動画の種類
+        sizes (list[tuple[int, int]]): 解像度
+        frames_list (list[int]): フレーム数
+
+    Returns:
+        list[Path]: 動画のパス
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    paths:list[Path] = []
+    for kind in kinds:
+        for width, height in sizes:
+            for frames in frames_list:
+                path = directory / f"{kind}-{width}x{height}-{frames}.mp4"
+                if not path.is_file():
+                    create_clip(path, kind, width, height, frames)
+                paths.append(path)
+    return paths
+
+
+class MemorySampler:
+    """プロセスの常駐メモリの最大値の計測
+
+    NOTE: OpenCVの画像はPythonのメモリ確保を通らないため、tracemallocではなくRSSを定期的に読み取ります。
+    """
+    # 計測間隔(秒)
+    INTERVAL = 0.01
+
+    def __init__(self) -> None:
+        """コンストラクタ
+        """
+        self.peak = 0
+        self.__stop = th.Event()
+        self.__thread:Optional[th.Thread] = None
+
+    @staticmethod
+    def get_rss() -> Optional[int]:
+        """常駐メモリのバイト数を取得
+
+        Returns:
+            Optional[int]: 常駐メモリのバイト数、又は取得できない環境ではNoneを返します。
+        """
+        try:
+            with open("/proc/self/statm", "r") as fp:
+                return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            return None
+
+    def __enter__(self) -> "MemorySampler":
+        self.peak = self.get_rss() or 0
+        self.__stop.clear()
+        self.__thread = th.Thread(target=self.update_sample, daemon=True)
+        self.__thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.__stop.set()
+        self.__thread.join()
+
+    def update_sample(self) -> None:
+        """[Thread-N] 常駐メモリの定期的な計測
+        """
+        while not self.__stop.wait(self.INTERVAL):
+            if (rss:=self.get_rss()) is None:
+                return
+            self.peak = max(self.peak, rss)
+
+
+def run_case(input_path:Path, output_path:Path, settings:dict[str, Any], num_workers:int) -> dict[str, Any]:
+    """1つの動画と設定のGIF変換の計測
+
+    ステージごとの合計時間は、同じ変換をPipelineTracerで記録して求めます。
+    NOTE: 並列に処理したステージは全スレッドの合計のため、経過時間を超える場合があります。
+
+    Args:
+        input_path (Path): 動画の入力パス
+        output_path (Path): GIFの出力パス
+        settings (dict[str, Any]): GIFConverter.exportへ渡す設定
+        num_workers (int): 使用するコア数
+
+    Returns:
+        dict[str, Any]: 計測結果
+    """
+    exported = th.Event()
+    results = {"success": False}
+
+    def exported_callback(is_success:bool, _:str) -> None:
+        results["success"] = is_success
+        exported.set()
+
+    args = {"resize": 1.0, "quantize_method": int(Image.Quantize.MEDIANCUT), "quantize_kmenas": 0, "play_speed": 1.0}
+    args.update(settings)
+
+    with WithVideoCapture(str(input_path)) as cap:
+        frames = cap.frames
+
+    converter = GIFConverter()
+    converter.tracer = PipelineTracer()
+
+    with MemorySampler() as sampler:
+        start = time.perf_counter()
+        if converter.export(input_path, output_path, num_workers=num_workers, exported_callback=exported_callback, **args):
+            exported.wait()
+        seconds = time.perf_counter() - start
+
+    return {
+        "success": results["success"],
+        "frames": frames,
+        "seconds": seconds,
+        "fps": frames / seconds if seconds > 0.0 else 0.0,
+        "peak_memory": sampler.peak,
+        "output_bytes": output_path.stat().st_size if results["success"] else 0,
+        "stages": {stage: values["total"] for stage, values in converter.tracer.get_summary()["stages"].items()},
+    }
+
+
+def benchmark(
+    clips:list[Path],
+    settings_names:list[str],
+    workers_list:list[int],
+    output_dir:Path,
+    repeat:int = 1,
+) -> list[dict[str, Any]]:
+    """動画と設定の全ての組み合わせの計測
+
+    Args:
+        clips (list[Path]): 動画のパス
+        settings_names (list[str]): 設定の名前
+        workers_list (list[int]): 使用するコア数
+        output_dir (Path): GIFの出力先
+        repeat (int, optional): 繰り返し回数(最も速い結果を採用します). Defaults to 1.
+
+    Returns:
+        list[dict[str, Any]]: 計測結果
+    """
+    results:list[dict[str, Any]] = []
+    for clip in clips:
+        for name in settings_names:
+            settings = SETTINGS[name]
+            for num_workers in workers_list:
+                output_path = output_dir / f"{clip.stem}-{name}-{num_workers}.gif"
+                runs = [run_case(clip, output_path, settings, num_workers) for _ in range(max(1, repeat))]
+                result = max(runs, key=lambda run: run["fps"])
+                result.update({
+                    "clip": clip.name,
+                    "settings": name,
+                    "num_workers": num_workers,
+                })
+                results.append(result)
+                print(f"{clip.name:>32} {name:>16} workers={num_workers:<2} {result['fps']:8.1f} fps {result['output_bytes']:>10} bytes", file=sys.stderr)
+    return results
+
+
+def get_environment() -> dict[str, Any]:
+    """計測環境を取得
+
+    Returns:
+        dict[str, Any]: 計測結果の比較時に確認するライブラリのバージョンとコア数
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "pillow": PIL.__version__,
+        "cpus": WorkerTuner.get_cpu_count(),
+    }
+
+
+def compare(baseline:dict[str, Any], current:dict[str, Any], threshold:float = REGRESSION_THRESHOLD) -> list[dict[str, Any]]:
+    """2つの計測結果の比較
+
+    同じ動画、設定、コア数の組み合わせごとに、処理速度の低下と出力サイズの増加を比較します。
+
+    Args:
+        baseline (dict[str, Any]): 基準の計測結果
+        current (dict[str, Any]): 比較する計測結果
+        threshold (float, optional): 悪化とみなす割合. Defaults to REGRESSION_THRESHOLD.
+
+    Returns:
+        list[dict[str, Any]]: 組み合わせごとの比較結果(regressionに悪化した項目)
+    """
+    def get_key(result:dict[str, Any]) -> tuple[str, str, int]:
+        return result["clip"], result["settings"], result["num_workers"]
+
+    baselines = {get_key(result): result for result in baseline["results"]}
+    comparisons:list[dict[str, Any]] = []
+    for result in current["results"]:
+        if (base:=baselines.get(get_key(result))) is None:
+            continue
+
+        fps_ratio = result["fps"] / base["fps"] if base["fps"] > 0.0 else 1.0
+        bytes_ratio = result["output_bytes"] / base["output_bytes"] if base["output_bytes"] > 0 else 1.0
+        regression = []
+        if fps_ratio < 1.0 - threshold:
+            regression.append("fps")
+        if bytes_ratio > 1.0 + threshold:
+            regression.append("output_bytes")
+        if result["success"] != base["success"]:
+            regression.append("success")
+
+        comparisons.append({
+            "clip": result["clip"],
+            "settings": result["settings"],
+            "num_workers": result["num_workers"],
+            "fps_ratio": fps_ratio,
+            "bytes_ratio": bytes_ratio,
+            "regression": regression,
+        })
+    return comparisons
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="合成動画によるGIF変換のベンチマーク")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="計測してJSONへ出力")
+    run_parser.add_argument("--output", type=Path, required=True, help="計測結果のJSONの出力パス")
+    run_parser.add_argument("--clip-dir", type=Path, default=Path(tempfile.gettempdir()) / "gifconverter-benchmark")
+    run_parser.add_argument("--kinds", nargs="+", choices=CLIP_KINDS, default=list(CLIP_KINDS))
+    run_parser.add_argument("--sizes", nargs="+", default=[f"{width}x{height}" for width, height in CLIP_SIZES])
+    run_parser.add_argument("--frames", nargs="+", type=int, default=list(CLIP_FRAMES))
+    run_parser.add_argument("--settings", nargs="+", choices=SETTINGS.keys(), default=list(SETTINGS))
+    run_parser.add_argument("--workers", nargs="+", type=int, default=list(WORKERS), help="使用するコア数(0で自動)")
+    run_parser.add_argument("--repeat", type=int, default=3, help="繰り返し回数(最も速い結果を採用します)")
+
+    compare_parser = subparsers.add_parser("compare", help="2つの計測結果を比較")
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        sizes = [tuple(int(value) for value in size.split("x")) for size in args.sizes]
+        clips = create_clips(args.clip_dir / "clips", args.kinds, sizes, args.frames)
+        output_dir = args.clip_dir / "outputs"
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        results = benchmark(clips, args.settings, args.workers, output_dir, args.repeat)
+        args.output.write_text(json.dumps({"environment": get_environment(), "results": results}, indent=2))
+    else:
+        baseline = json.loads(args.baseline.read_text())
+        current = json.loads(args.current.read_text())
+        if baseline["environment"] != current["environment"]:
+            print("warning: environments differ.", file=sys.stderr)
+
+        comparisons = compare(baseline, current, args.threshold)
+        for comparison in comparisons:
+            flag = "REGRESSION " + ",".join(comparison["regression"]) if comparison["regression"] else "ok"
+            print(f"{comparison['clip']:>32} {comparison['settings']:>16} workers={comparison['num_workers']:<2} fps x{comparison['fps_ratio']:.2f} bytes x{comparison['bytes_ratio']:.2f} {flag}")
+        sys.exit(1 if any(comparison["regression"] for comparison in comparisons) else 0)
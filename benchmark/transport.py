@@ -0,0 +1,109 @@
+import argparse
+import multiprocessing as mp
+import queue
+import threading as th
+import time
+from typing import Any, Callable
+import numpy as np
+
+from runtime.frame_queue import FrameReorderBuffer, BoundedFrameQueue
+
+
+def update_passthrough(input_queue:Any, output_queue:Any) -> None:
+    """受け取った画像をそのまま出力
+
+    Args:
+        input_queue (Any): 画像の入力キュー
+        output_queue (Any): 画像の出力先
+    """
+    while (values:=input_queue.get()) is not None:
+        output_queue.put(values)
+
+
+def run_transport(
+    input_queue:Any,
+    output_queue:Any,
+    get_output:Callable[[], Any],
+    images:list[np.ndarray],
+    frames:int,
+    num_workers:int,
+) -> float:
+    """転送の計測
+
+    Args:
+        input_queue (Any): 画像の入力キュー
+        output_queue (Any): 画像の出力先
+        get_output (Callable[[], Any]): 出力の取り出し
+        images (list[np.ndarray]): 転送する画像
+        frames (int): 転送するフレーム数
+        num_workers (int): ワーカー数
+
+    Returns:
+        float: 1秒あたりのフレーム数
+    """
+    threads = [th.Thread(target=update_passthrough, args=(input_queue, output_queue), daemon=True) for _ in range(num_workers)]
+    for thread in threads:
+        thread.start()
+
+    def update_read() -> None:
+        for frame in range(frames):
+            input_queue.put((frame, images[frame % len(images)]))
+        for _ in range(num_workers):
+            input_queue.put(None)
+
+    start = time.perf_counter()
+    reader = th.Thread(target=update_read, daemon=True)
+    reader.start()
+    for _ in range(frames):
+        get_output()
+    elapsed = time.perf_counter() - start
+
+    reader.join()
+    for thread in threads:
+        thread.join()
+
+    return frames / elapsed
+
+
+def benchmark(width:int, height:int, frames:int, num_workers:int) -> dict[str, float]:
+    """mp.Queueと参照渡しのキューの比較
+
+    Args:
+        width (int): 画像の横幅
+        height (int): 画像の縦幅
+        frames (int): 転送するフレーム数
+        num_workers (int): ワーカー数
+
+    Returns:
+        dict[str, float]: 転送方式ごとの1秒あたりのフレーム数
+    """
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+
+    # 従来の転送(入出力ともにmp.Queue)
+    input_queue, output_queue = mp.Queue(), mp.Queue()
+    mp_queue_fps = run_transport(input_queue, output_queue, output_queue.get, images, frames, num_workers)
+
+    # 参照渡しの転送
+    input_queue = BoundedFrameQueue(queue.SimpleQueue(), num_workers * 2)
+    output_queue = FrameReorderBuffer(num_workers * 2)
+    simple_queue_fps = run_transport(input_queue, output_queue, output_queue.get, images, frames, num_workers)
+
+    return {
+        "mp.Queue": mp_queue_fps,
+        "SimpleQueue": simple_queue_fps,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="量子化ワーカーへの画像転送の計測")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--num-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    results = benchmark(args.width, args.height, args.frames, args.num_workers)
+    for name, fps in results.items():
+        print(f"{name:>12}: {fps:10.1f} frames/sec")
+    print(f"{'speedup':>12}: {results['SimpleQueue'] / results['mp.Queue']:10.1f}x")
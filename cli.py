@@ -0,0 +1,357 @@
+import argparse
+import glob
+import json
+import sys
+import threading as th
+import time
+from pathlib import Path
+from typing import Optional, Callable, Any
+from PIL import Image
+
+from runtime.export_progress import ExportProgress
+from runtime.frame_quantizer import FrameQuantizer
+from runtime.gif_converter import GIFConverter, WithVideoCapture
+from runtime.pipeline_tracer import PipelineTracer
+from runtime.worker_tuner import WorkerTuner
+
+
+__all__ = [
+    "get_glob_root",
+    "find_inputs",
+    "get_num_workers",
+    "run_batch",
+    "main",
+]
+
+
+# 量子化の種類
+QUANTIZE_METHODS = {
+    "none": -1,
+    "mediancut": int(Image.Quantize.MEDIANCUT),
+    "maxcoverage": int(Image.Quantize.MAXCOVERAGE),
+    "fastoctree": int(Image.Quantize.FASTOCTREE),
+    "kmeans": FrameQuantizer.MINIBATCH_KMEANS,
+}
+
+# ディザの種類
+QUANTIZE_DITHERS = {
+    "none": int(Image.Dither.NONE),
+    "ordered": FrameQuantizer.DITHER_ORDERED,
+    "floydsteinberg": int(Image.Dither.FLOYDSTEINBERG),
+}
+
+# 量子化ワーカー1つあたりに割り当てる処理量(リサイズ後の画素数×フレーム数)
+# NOTE: これ未満の短い動画や小さい動画はワーカー1つで処理し、コア数分の動画を同時に変換します。
+PIXELS_PER_WORKER = 1 << 27
+
+
+def get_glob_root(pattern:str) -> Path:
+    """globパターンのワイルドカードを含まない先頭のディレクトリを取得
+
+    Args:
+        pattern (str): globパターン
+
+    Returns:
+        Path: ワイルドカードを含む最初の要素より前のディレクトリ
+    """
+    parts:list[str] = []
+    for part in Path(pattern).parts:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return Path(*parts)
+
+
+def find_inputs(patterns:list[str], output_dir:Optional[Path]) -> list[tuple[Path, Path]]:
+    """入力されたファイル、ディレクトリ、globパターンから変換する動画を探す
+
+    ディレクトリは変換可能な拡張子の動画を再帰的に探し、出力先にはディレクトリ内の相対パスを保ちます。
+    globパターンも同じく、ワイルドカードを含まない先頭のディレクトリからの相対パスを保ちます。
+
+    Args:
+        patterns (list[str]): ファイル、ディレクトリ、又はglobパターン
+        output_dir (Optional[Path]): 出力先のディレクトリ(Noneの場合は動画と同じディレクトリ)
+
+    Returns:
+        list[tuple[Path, Path]]: 動画の入力パスとGIFの出力パス(重複は除きます)
+    """
+    results:dict[Path, Path] = {}
+
+    def add(input_path:Path, relative_path:Path) -> None:
+        if input_path.suffix not in GIFConverter.SUPPORT_SUFFIXES or input_path.resolve() in results:
+            return
+        if output_dir is None:
+            output_path = input_path.with_suffix(".gif")
+        else:
+            output_path = (output_dir / relative_path).with_suffix(".gif")
+        results[input_path.resolve()] = output_path
+
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths = [Path(path) for path in sorted(glob.glob(pattern, recursive=True))]
+            root = get_glob_root(pattern)
+        else:
+            paths, root = [Path(pattern)], None
+        for path in paths:
+            if path.is_dir():
+                for input_path in sorted(path.rglob("*")):
+                    if input_path.is_file():
+                        add(input_path, input_path.relative_to(path))
+            elif path.is_file():
+                add(path, path.relative_to(root) if root is not None else Path(path.name))
+
+    return [(input_path, output_path) for input_path, output_path in results.items()]
+
+
+def get_num_workers(input_path:Path, resize:float, cpus:int) -> int:
+    """動画の処理量に応じた使用コア数を取得
+
+    Args:
+        input_path (Path): 動画の入力パス
+        resize (float): リサイズ
+        cpus (int): 使用できるCPUコア数
+
+    Returns:
+        int: 使用コア数(1~cpus)
+    """
+    with WithVideoCapture(str(input_path)) as cap:
+        pixels = cap.width * cap.height * resize * resize * max(1, cap.frames)
+    return max(1, min(cpus, round(pixels / PIXELS_PER_WORKER)))
+
+
+def run_job(
+    input_path:Path,
+    output_path:Path,
+    num_workers:int,
+    settings:dict[str, Any],
+    trace_dir:Optional[Path] = None,
+    progress_callback:Optional[Callable[[Path, ExportProgress], None]] = None,
+) -> dict[str, Any]:
+    """[Thread-N] 動画1つのGIF変換
+
+    Args:
+        input_path (Path): 動画の入力パス
+        output_path (Path): GIFの出力パス
+        num_workers (int): 使用コア数(量子化とLZW圧縮のワーカー数は処理時間に応じて配分されます)
+        settings (dict[str, Any]): GIFConverter.exportへ渡す設定
+        trace_dir (Optional[Path], optional): ステージごとの処理時間のトレースの出力先(Noneで記録しません). Defaults to None.
+        progress_callback (Optional[Callable[[Path, ExportProgress], None]], optional): 動画の入力パスと進捗のコールバック. Defaults to None.
+
+    Returns:
+        dict[str, Any]: 変換結果の概要
+    """
+    exported = th.Event()
+    results = {"success": False}
+
+    def exported_callback(is_success:bool, _:str) -> None:
+        results["success"] = is_success
+        exported.set()
+
+    def update_progress(progress:ExportProgress) -> None:
+        progress_callback(input_path, progress)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    converter = GIFConverter()
+    if trace_dir is not None:
+        converter.tracer = PipelineTracer()
+
+    start = time.perf_counter()
+    if converter.export(
+        input_path,
+        output_path,
+        num_workers=num_workers,
+        exported_callback=exported_callback,
+        progress_callback=update_progress if progress_callback is not None else None,
+        **settings,
+    ):
+        exported.wait()
+    seconds = time.perf_counter() - start
+
+    result = {
+        "input": str(input_path),
+        "output": str(output_path),
+        "success": results["success"],
+        "seconds": round(seconds, 3),
+        "input_bytes": input_path.stat().st_size,
+        "output_bytes": output_path.stat().st_size if results["success"] else 0,
+        "num_workers": num_workers,
+    }
+
+    # トレースイベントとステージごとの合計時間
+    if converter.tracer is not None:
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        trace_path = trace_dir / output_path.with_suffix(".trace.json").name
+        converter.tracer.dump(trace_path)
+        result["trace"] = str(trace_path)
+        result["stages"] = {stage: round(values["total"], 3) for stage, values in converter.tracer.get_summary()["stages"].items()}
+
+    return result
+
+
+def run_batch(
+    jobs:list[tuple[Path, Path, int]],
+    cpus:int,
+    settings:dict[str, Any],
+    callback:Optional[Callable[[dict[str, Any]], None]] = None,
+    trace_dir:Optional[Path] = None,
+    progress_callback:Optional[Callable[[Path, ExportProgress], None]] = None,
+) -> list[dict[str, Any]]:
+    """[MainThread] 複数の動画のGIF変換
+
+    使用コア数の合計が使用できるコア数に収まる範囲で、複数の動画を同時に変換します。
+    NOTE: 大きい動画から順に割り当てることで、最後に大きい動画だけが残って待たされることを防ぎます。
+
+    Args:
+        jobs (list[tuple[Path, Path, int]]): 動画の入力パス、GIFの出力パス、使用コア数
+        cpus (int): 使用できるCPUコア数
+        settings (dict[str, Any]): GIFConverter.exportへ渡す設定
+        callback (Optional[Callable[[dict[str, Any]], None]], optional): 動画1つの変換完了ごとのコールバック. Defaults to None.
+        trace_dir (Optional[Path], optional): ステージごとの処理時間のトレースの出力先(Noneで記録しません). Defaults to None.
+        progress_callback (Optional[Callable[[Path, ExportProgress], None]], optional): 動画の入力パスと進捗のコールバック(変換スレッドから呼び出されます). Defaults to None.
+
+    Returns:
+        list[dict[str, Any]]: 完了順の変換結果の概要
+    """
+    condition = th.Condition()
+    free = cpus
+    results:list[dict[str, Any]] = []
+
+    def update_job(input_path:Path, output_path:Path, num_workers:int) -> None:
+        nonlocal free
+        try:
+            result = run_job(input_path, output_path, num_workers, settings, trace_dir, progress_callback)
+        except Exception as e:
+            result = {"input": str(input_path), "output": str(output_path), "success": False, "error": str(e)}
+        with condition:
+            results.append(result)
+            if callback is not None:
+                callback(result)
+            free += num_workers
+            condition.notify_all()
+
+    threads:list[th.Thread] = []
+    for input_path, output_path, num_workers in sorted(jobs, key=lambda job: job[2], reverse=True):
+        num_workers = min(num_workers, cpus)
+        with condition:
+            condition.wait_for(lambda: free >= num_workers)
+            free -= num_workers
+        thread = th.Thread(target=update_job, args=(input_path, output_path, num_workers), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def main(argv:Optional[list[str]] = None) -> int:
+    """[MainThread] コマンドラインからのGIF変換
+
+    変換結果の概要は動画ごとに1行のJSONとして標準出力へ出力します。
+
+    Args:
+        argv (Optional[list[str]], optional): コマンドライン引数. Defaults to None.
+
+    Returns:
+        int: 全ての変換に成功した場合は0を返します。
+    """
+    parser = argparse.ArgumentParser(description="動画のGIF変換(ファイル、ディレクトリ、globパターンを指定できます)")
+    parser.add_argument("inputs", nargs="+", help="動画のファイル、ディレクトリ、又はglobパターン")
+    parser.add_argument("-o", "--output-dir", type=Path, default=None, help="出力先のディレクトリ(省略時は動画と同じディレクトリ)")
+    parser.add_argument("--resize", type=float, default=1.0)
+    parser.add_argument("--quantize-method", choices=QUANTIZE_METHODS.keys(), default="mediancut")
+    parser.add_argument("--quantize-kmeans", type=int, default=0)
+    parser.add_argument("--quantize-dither", choices=QUANTIZE_DITHERS.keys(), default="none")
+    parser.add_argument("--quantize-colors", type=int, default=GIFConverter.MAX_QUANTIZE_COLORS, help=f"減色後の色数(1~{GIFConverter.MAX_QUANTIZE_COLORS})")
+    parser.add_argument("--play-speed", type=float, default=1.0)
+    parser.add_argument("--fps", type=float, default=0.0, help="出力するGIFのフレームレート(0で元動画のフレームレート)")
+    parser.add_argument("--start", type=float, default=-1.0, help="出力範囲の開始(秒)")
+    parser.add_argument("--end", type=float, default=-1.0, help="出力範囲の終了(秒)")
+    parser.add_argument("--global-palette", action="store_true")
+    parser.add_argument("--scene-threshold", type=float, default=-1.0)
+    parser.add_argument("--dedupe-threshold", type=int, default=0)
+    parser.add_argument("--no-delta", action="store_true", help="前フレームからの変化領域のみを書き込む処理を無効にします")
+    parser.add_argument("--target-size", type=float, default=0.0, help="出力ファイルサイズの上限(MB)")
+    parser.add_argument("--backend", choices=(GIFConverter.BACKEND_THREAD, GIFConverter.BACKEND_PROCESS), default=GIFConverter.BACKEND_THREAD)
+    parser.add_argument("--cache-dir", default="")
+    parser.add_argument("--frame-cache-dir", default="")
+    parser.add_argument("--cpus", type=int, default=0, help="使用するCPUコア数(0で自動)")
+    parser.add_argument("--trace-dir", type=Path, default=None, help="ステージごとの処理時間をChromeのトレースイベント形式で出力するディレクトリ")
+    parser.add_argument("--progress", action="store_true", help="変換中の進捗を標準エラー出力へ出力します")
+    parser.add_argument("--num-workers", type=int, default=0, help="動画1つあたりの使用コア数(0で動画の処理量に応じた自動設定)")
+    args = parser.parse_args(argv)
+    if not 1 <= args.quantize_colors <= GIFConverter.MAX_QUANTIZE_COLORS:
+        parser.error(f"argument --quantize-colors: must be between 1 and {GIFConverter.MAX_QUANTIZE_COLORS}")
+
+    cpus = args.cpus if args.cpus > 0 else WorkerTuner.get_cpu_count()
+    settings = {
+        "resize": args.resize,
+        "quantize_method": QUANTIZE_METHODS[args.quantize_method],
+        "quantize_kmenas": args.quantize_kmeans,
+        "play_speed": args.play_speed,
+        "backend": args.backend,
+        "global_palette": args.global_palette,
+        "delta_encoding": not args.no_delta,
+        "dedupe_threshold": args.dedupe_threshold,
+        "target_fps": args.fps,
+        "start_time": args.start,
+        "end_time": args.end,
+        "scene_threshold": args.scene_threshold,
+        "quantize_dither": QUANTIZE_DITHERS[args.quantize_dither],
+        "quantize_colors": args.quantize_colors,
+        "target_size": int(args.target_size * 1024 * 1024),
+        "cache_dir": args.cache_dir,
+        "frame_cache_dir": args.frame_cache_dir,
+    }
+
+    inputs = find_inputs(args.inputs, args.output_dir)
+    if len(inputs) == 0:
+        print("no input videos found.", file=sys.stderr)
+        return 1
+
+    # NOTE: 出力先が重複すると複数のスレッドが同じファイルへ書き込むため、変換前に中止します。
+    outputs:dict[Path, Path] = {}
+    for input_path, output_path in inputs:
+        if (other:=outputs.setdefault(output_path.resolve(), input_path)) != input_path:
+            print(f"duplicate output: {output_path} ({other}, {input_path})", file=sys.stderr)
+            return 1
+
+    jobs = [
+        (input_path, output_path, args.num_workers if args.num_workers > 0 else get_num_workers(input_path, args.resize, cpus))
+        for input_path, output_path in inputs
+    ]
+
+    def print_result(result:dict[str, Any]) -> None:
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    # NOTE: 進捗は0.1秒ごとに届くため、1秒ごとに間引いて出力します。
+    printed:dict[Path, float] = {}
+
+    def print_progress(input_path:Path, progress:ExportProgress) -> None:
+        now = time.perf_counter()
+        if now - printed.get(input_path, 0.0) < 1.0 and progress.completed < progress.total:
+            return
+        printed[input_path] = now
+        eta = f"{progress.eta:.0f}s" if progress.eta >= 0.0 else "-"
+        print(
+            f"{input_path.name}: {progress.ratio * 100:5.1f}% "
+            f"decoded={progress.decoded} quantized={progress.quantized} written={progress.written} "
+            f"({progress.completed}/{progress.total}) {progress.fps:.1f}fps eta={eta}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    start = time.perf_counter()
+    results = run_batch(jobs, cpus, settings, print_result, args.trace_dir, print_progress if args.progress else None)
+    seconds = time.perf_counter() - start
+
+    failed = sum(1 for result in results if not result["success"])
+    print(f"{len(results) - failed}/{len(results)} files converted in {seconds:.2f} sec.", file=sys.stderr)
+
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
 from editor.input_video_file import *
 from editor.quantize_method import *
+from editor.quantize_dither import *
 from editor.quantize_kmeans import *
 from editor.image_resize import *
 from editor.play_speed import *
 from editor.output_gif_file import *
 from editor.export_state import *
 from editor.export_file_size import *
+from editor.target_file_size import *
 from editor.image_view import *
@@ -22,6 +22,7 @@ class ExportState:
         columnspan:Union[int, tuple[int, int, int]] = (1, 1, 1),
         sticky:Union[str, tuple[str, str, str]] = (EW, EW, EW),
         callback_export:Optional[Callable[[], None]] = None,
+        callback_cancel:Optional[Callable[[], None]] = None,
         *args,
         **kwargs,
     ) -> None:
@@ -31,11 +32,16 @@ class ExportState:
         label.grid(column=grid.column, row=grid.row, columnspan=grid.columnspan, pady=(5, 0), sticky=grid.sticky)
         ToolTip(label, text="出力結果によってボタンの色が変わります。")
 
-        self.progressbar = ttk.Progressbar(master, mode=DETERMINATE, bootstyle=(STRIPED, PRIMARY))
+        self.progressbar = ttk.Progressbar(master, mode=DETERMINATE, maximum=1.0, bootstyle=(STRIPED, PRIMARY))
         self.progressbar.grid(column=grid.column+1, row=grid.row, columnspan=grid.columnspan, padx=(0, 10), pady=(5, 0), sticky=grid.sticky)
 
         self.button = ttk.Button(master, text="Export", bootstyle=(SOLID, PRIMARY), state=DISABLED, command=callback_export)
         self.button.grid(column=grid.column+2, row=grid.row, columnspan=grid.columnspan, pady=(5, 0), sticky=grid.sticky)
+        ToolTip(self.button, text="出力中はボタンを押すと出力を中止します。")
+
+        # register callback.
+        self.callback_export = callback_export
+        self.callback_cancel = callback_cancel
 
     def set_button_state(self, state:str) -> None:
         """ボタンの状態をセットします。
@@ -48,14 +54,32 @@ class ExportState:
     def start(self) -> None:
         """出力開始
         """
-        self.progressbar.start()
-        self.button.configure(state=DISABLED)
+        self.progressbar.configure(value=0.0)
+        if self.callback_cancel is not None:
+            self.button.configure(text="Cancel", state=ACTIVE, bootstyle=(SOLID, WARNING), command=self.callback_cancel)
+        else:
+            self.button.configure(state=DISABLED)
+
+    def set_progress(self, ratio:float) -> None:
+        """出力の進捗をセットします。
+
+        Args:
+            ratio (float): 進捗率(0.0~1.0)
+        """
+        self.progressbar.configure(value=ratio)
 
-    def end(self, is_success:bool) -> None:
+    def end(self, is_success:bool, is_cancelled:bool=False) -> None:
         """出力終了
 
         Args:
             is_success (bool): 出力の成否
+            is_cancelled (bool, optional): 出力を中止した場合はTrueを指定します. Defaults to False.
         """
-        self.progressbar.stop()
-        self.button.configure(state=ACTIVE, bootstyle=(SOLID, (SUCCESS if is_success else DANGER)))
+        if is_success:
+            bootstyle = SUCCESS
+        elif is_cancelled:
+            bootstyle = SECONDARY
+        else:
+            bootstyle = DANGER
+        self.progressbar.configure(value=1.0 if is_success else 0.0)
+        self.button.configure(text="Export", state=ACTIVE, bootstyle=(SOLID, bootstyle), command=self.callback_export)
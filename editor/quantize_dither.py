@@ -0,0 +1,52 @@
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from ttkbootstrap.tooltip import ToolTip
+
+from typing import Union
+from PIL import Image
+
+from editor.grid_util import *
+from runtime.frame_quantizer import FrameQuantizer
+
+
+__all__ = [
+    "QuantizeDither",
+]
+
+
+class QuantizeDither:
+    def __init__(
+        self,
+        master:tk.Misc,
+        column:Union[int, tuple[int, int, int]],
+        row:Union[int, tuple[int, int, int]],
+        columnspan:Union[int, tuple[int, int, int]] = (1, 1, 1),
+        sticky:Union[str, tuple[str, str, str]] = (EW, EW, EW),
+        *args,
+        **kwargs,
+    ) -> None:
+        grid = GridUtil(column, row, columnspan, sticky)
+
+        label = ttk.Label(master, text="Quantize dither")
+        label.grid(column=grid.column, row=grid.row, columnspan=grid.columnspan, pady=(5, 0), sticky=grid.sticky)
+        ToolTip(label, text="ディザの種類\nNONE:ディザなし\nORDERED:グラデーションの縞を軽減/フレーム間で模様が安定", delay=100)
+
+        self.quantize_dither_var = ttk.IntVar(value=int(Image.Dither.NONE))
+
+        none_radiobutton = ttk.Radiobutton(master, text="None", variable=self.quantize_dither_var, value=int(Image.Dither.NONE))
+        none_radiobutton.grid(column=grid.column+1, row=grid.row, pady=(5, 0), sticky=grid.sticky)
+        ToolTip(none_radiobutton, text="ディザなし", delay=100)
+
+        ordered_radiobutton = ttk.Radiobutton(master, text="Ordered", variable=self.quantize_dither_var, value=FrameQuantizer.DITHER_ORDERED)
+        ordered_radiobutton.grid(column=grid.column+2, row=grid.row, pady=(5, 0), sticky=grid.sticky)
+        ToolTip(ordered_radiobutton, text="Bayer行列による組織的ディザ", delay=100)
+
+    @property
+    def quantize_dither(self) -> int:
+        """ディザの種類を取得
+
+        Returns:
+            int: ディザの種類
+        """
+        return self.quantize_dither_var.get()
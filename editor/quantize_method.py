@@ -7,6 +7,7 @@ from typing import Union
 from PIL import Image
 
 from editor.grid_util import *
+from runtime.frame_quantizer import FrameQuantizer
 
 
 __all__ = [
@@ -18,10 +19,10 @@ class QuantizeMethod:
     def __init__(
         self,
         master:tk.Misc,
-        column:Union[int, tuple[int, int, int, int]],
-        row:Union[int, tuple[int, int, int, int]],
-        columnspan:Union[int, tuple[int, int, int, int]] = (1, 1, 1, 1),
-        sticky:Union[str, tuple[str, str, str, str]] = (EW, EW, EW, EW),
+        column:Union[int, tuple[int, int, int, int, int]],
+        row:Union[int, tuple[int, int, int, int, int]],
+        columnspan:Union[int, tuple[int, int, int, int, int]] = (1, 1, 1, 1, 1),
+        sticky:Union[str, tuple[str, str, str, str, str]] = (EW, EW, EW, EW, EW),
         *args,
         **kwargs,
     ) -> None:
@@ -29,7 +30,7 @@ class QuantizeMethod:
 
         label = ttk.Label(master, text="Quantize method")
         label.grid(column=grid.column, row=grid.row, columnspan=grid.columnspan, pady=(10, 5), sticky=grid.sticky)
-        ToolTip(label, text="量子化の種類\nNONE:圧縮なし\nMEDIANCUT:品質(高)/圧縮(低)\nFASTOCTREE:品質(低)/圧縮(高)", delay=100)
+        ToolTip(label, text="量子化の種類\nNONE:圧縮なし\nMEDIANCUT:品質(高)/圧縮(低)\nFASTOCTREE:品質(低)/圧縮(高)\nK-MEANS:品質(中)/フレーム間で色が安定", delay=100)
 
         self.quantize_method_var = ttk.IntVar(value=int(Image.Quantize.MEDIANCUT))
 
@@ -45,6 +46,10 @@ class QuantizeMethod:
         fastoctree_radiobutton.grid(column=grid.column+3, row=grid.row, pady=(10, 5), sticky=grid.sticky)
         ToolTip(fastoctree_radiobutton, text="品質(低)/圧縮(高)", delay=100)
 
+        kmeans_radiobutton = ttk.Radiobutton(master, text="K-means", variable=self.quantize_method_var, value=FrameQuantizer.MINIBATCH_KMEANS)
+        kmeans_radiobutton.grid(column=grid.column+4, row=grid.row, pady=(10, 5), sticky=grid.sticky)
+        ToolTip(kmeans_radiobutton, text="品質(中)/フレーム間で色が安定", delay=100)
+
     @property
     def quantize_method(self) -> int:
         """量子化の種類を取得
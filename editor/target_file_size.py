@@ -0,0 +1,61 @@
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from ttkbootstrap.tooltip import ToolTip
+
+from typing import Union
+
+from editor.grid_util import *
+
+
+__all__ = [
+    "TargetFileSize",
+]
+
+
+class TargetFileSize:
+    def __init__(
+        self,
+        master:tk.Misc,
+        column:Union[int, tuple[int, int]],
+        row:Union[int, tuple[int, int]],
+        columnspan:Union[int, tuple[int, int]] = (1, 1),
+        sticky:Union[str, tuple[str, str]] = (EW, EW),
+        *args,
+        **kwargs,
+    ) -> None:
+        grid = GridUtil(column, row, columnspan, sticky)
+
+        self.target_size_var = ttk.StringVar(value="0")
+
+        label = ttk.Label(master, text="Target file size (MB)")
+        label.grid(column=grid.column, row=grid.row, columnspan=grid.columnspan, pady=(5, 0), sticky=grid.sticky)
+        ToolTip(label, text="出力ファイルサイズの上限\nリサイズ、色数、フレームレートを上限に収まるよう下げて出力します。\n0で無効", delay=100)
+
+        self.entry = ttk.Entry(master, textvariable=self.target_size_var, validate="all", validatecommand=(master.register(self.set_target_size), "%P"))
+        self.entry.grid(column=grid.column+1, row=grid.row, columnspan=grid.columnspan, padx=(0, 10), pady=(5, 0), sticky=grid.sticky)
+
+    def set_target_size(self, new_target_size:str) -> bool:
+        """出力ファイルサイズの上限をセット
+
+        Args:
+            new_target_size (str): 新しい出力ファイルサイズの上限(MB)
+
+        Returns:
+            bool: 0未満や数値以外が入力された場合はFalseを返します。
+        """
+        try:
+            return new_target_size == "" or float(new_target_size) >= 0.0
+        except Exception as e:
+            return False
+
+    @property
+    def target_size(self) -> int:
+        """出力ファイルサイズの上限を取得
+
+        Returns:
+            int: 出力ファイルサイズの上限(バイト)、又は無効の場合は0
+        """
+        if (value:=self.target_size_var.get()) == "":
+            return 0
+        return int(float(value) * 1024 * 1024)
@@ -2,6 +2,7 @@ import tkinter as tk
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 
+import tempfile
 from pathlib import Path
 from typing import Optional, Callable
 from PIL import Image
@@ -9,6 +10,7 @@ from PIL import Image
 from editor import *
 from editor.grid_util import *
 from runtime.gif_converter import GIFConverter
+from runtime.export_progress import ExportProgress
 
 
 class RowCounter:
@@ -40,19 +42,22 @@ class GIFConverterControlFrame(ttk.Frame):
         master:tk.Misc,
         callback_gif_export:Optional[Callable[[], None]] = None,
         callback_export_ready:Optional[Callable[[], bool]] = None,
+        callback_gif_cancel:Optional[Callable[[], None]] = None,
     ) -> None:
         super().__init__(master, relief=RAISED, padding=10)
 
         row = RowCounter()
 
         self.input_video_file = InputVideoFile(self, column=(0, 0, 1), row=row(), columnspan=(1, 2, 1), callback_path_update=self.update_input_path)
-        self.quantize_method = QuantizeMethod(self, column=0, row=row(), columnspan=(1, 1, 1, 1))
+        self.quantize_method = QuantizeMethod(self, column=0, row=row(), columnspan=(1, 1, 1, 1, 1))
+        self.quantize_dither = QuantizeDither(self, column=0, row=row(), columnspan=(1, 1, 1))
         self.quantize_kmeans = QuantizeKMeans(self, column=0, row=row(), columnspan=(1, 2, 1))
         self.image_resize = ImageResize(self, column=(0, 0), row=row(), columnspan=(1, 2))
         self.play_speed = PlaySpeed(self, column=(0, 0), row=row(), columnspan=(1, 2))
         self.output_gif_file = OutputGifFile(self, column=(0, 0, 1), row=row(), columnspan=(1, 2, 1))
+        self.target_file_size = TargetFileSize(self, column=0, row=row(), columnspan=(1, 2))
         self.export_file_size = ExportFileSize(self, column=0, row=row(), columnspan=(1, 2))
-        self.export_state = ExportState(self, column=(0, 0, 1), row=row(), columnspan=(1, 2, 1), callback_export=callback_gif_export)
+        self.export_state = ExportState(self, column=(0, 0, 1), row=row(), columnspan=(1, 2, 1), callback_export=callback_gif_export, callback_cancel=callback_gif_cancel)
 
         # register callback.
         self.callback_export_ready = callback_export_ready
@@ -88,6 +93,11 @@ class GIFPreviewFrame(ttk.Frame):
 
 
 class GIFConverterEditor(ttk.Window):
+    # デコード済みフレームのキャッシュの保存先と合計サイズの上限
+    # NOTE: 量子化の設定のみを変えて出力し直す場合に、動画のデコードとリサイズを省きます。
+    FRAME_CACHE_DIR = Path(tempfile.gettempdir()) / "gifconverter-frames"
+    FRAME_CACHE_MAX_BYTES = 1 << 30
+
     def __init__(self) -> None:
         super().__init__("GIFConverter", minsize=(640, 278), maxsize=(1152, 864))
 
@@ -95,7 +105,7 @@ class GIFConverterEditor(ttk.Window):
         self.gif_converter = GIFConverter()
 
         # 操作パネル
-        self.control_frame = GIFConverterControlFrame(self, self.gif_export, lambda: self.gif_converter.is_thread_ready())
+        self.control_frame = GIFConverterControlFrame(self, self.gif_export, lambda: self.gif_converter.is_thread_ready(), self.gif_cancel)
         self.control_frame.grid(column=0, row=0, padx=10, pady=10, sticky=NSEW)
 
         # GIFプレビュー
@@ -141,6 +151,15 @@ class GIFConverterEditor(ttk.Window):
         """
         return self.control_frame.quantize_method.quantize_method
 
+    @property
+    def quantize_dither(self) -> int:
+        """ディザの種類を取得
+
+        Returns:
+            int: ディザの種類
+        """
+        return self.control_frame.quantize_dither.quantize_dither
+
     @property
     def quantize_kmeans(self) -> int:
         """クラスタ数を取得
@@ -159,6 +178,15 @@ class GIFConverterEditor(ttk.Window):
         """
         return self.control_frame.play_speed.play_speed
 
+    @property
+    def target_size(self) -> int:
+        """出力ファイルサイズの上限を取得
+
+        Returns:
+            int: 出力ファイルサイズの上限(バイト)、又は無効の場合は0
+        """
+        return self.control_frame.target_file_size.target_size
+
     def get_output_path(self, input_path:Optional[Path]) -> Optional[Path]:
         """出力先を取得
 
@@ -236,13 +264,21 @@ class GIFConverterEditor(ttk.Window):
             is_success (bool): 出力結果の成否
             output_path (str): 出力先のパス
         """
-        self.control_frame.export_state.end(is_success)
+        self.control_frame.export_state.end(is_success, self.gif_converter.cancelled.is_set())
         if is_success:
             st_size = Path(output_path).stat().st_size
             self.control_frame.export_file_size.filesize_var.set(self.get_display_name_file_size(st_size))
         else:
             self.control_frame.export_file_size.filesize_var.set("nan")
 
+    def update_export_progress(self, progress:ExportProgress) -> None:
+        """Export進捗の更新
+
+        Args:
+            progress (ExportProgress): 出力の進捗
+        """
+        self.control_frame.export_state.set_progress(progress.ratio)
+
     def gif_export(self) -> None:
         """GIF作成
         """
@@ -259,14 +295,24 @@ class GIFConverterEditor(ttk.Window):
             self.quantize_method,
             self.quantize_kmeans,
             self.play_speed,
-            8,
+            GIFConverter.AUTO_WORKERS,
             self.set_preview_images,
             self.update_export_state,
+            quantize_dither=self.quantize_dither,
+            target_size=self.target_size,
+            frame_cache_dir=self.FRAME_CACHE_DIR,
+            frame_cache_max_bytes=self.FRAME_CACHE_MAX_BYTES,
+            progress_callback=self.update_export_progress,
         )
 
         if ret:
             self.control_frame.export_state.start()
 
+    def gif_cancel(self) -> None:
+        """GIF作成の中止
+        """
+        self.gif_converter.cancel()
+
 
 if __name__ == "__main__":
     app = GIFConverterEditor()
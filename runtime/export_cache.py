@@ -0,0 +1,183 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+from typing import Union, Any, Iterable
+
+
+__all__ = [
+    "ExportCache",
+]
+
+
+class ExportCache:
+    """入力動画と出力設定をキーとしたGIF出力結果のディスクキャッシュ
+
+    キーは入力動画のサイズ、更新日時、先頭・中央・末尾の内容のハッシュと出力設定から求めます。
+    キャッシュに有る場合は出力先へコピーするだけで出力を終えます。
+    NOTE: ハードリンクでは出力先への上書きがキャッシュまで書き換えるため、常にコピーします。
+    合計サイズが上限を超えた場合は、最も長く使われていないものから破棄します。
+    """
+    # キャッシュの形式(出力結果が変わる変更を行った場合は更新します)
+    VERSION = 2
+
+    # 内容のハッシュに使用する1箇所あたりのバイト数
+    HASH_CHUNK_BYTES = 1 << 20
+
+    # キャッシュファイルの拡張子
+    SUFFIX = ".gif"
+
+    def __init__(self, directory:Union[Path, str], max_bytes:int) -> None:
+        """コンストラクタ
+
+        Args:
+            directory (Union[Path, str]): キャッシュの保存先
+            max_bytes (int): キャッシュの合計サイズの上限(0以下で無制限)
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def get_file_hash(path:Union[Path, str]) -> str:
+        """ファイルの内容のハッシュを取得
+
+        NOTE: 全体を読むと大きな動画で時間が掛かるため、先頭・中央・末尾のみを読みます。
+
+        Args:
+            path (Union[Path, str]): ファイルパス
+
+        Returns:
+            str: ハッシュ
+        """
+        size = os.path.getsize(path)
+        chunk = ExportCache.HASH_CHUNK_BYTES
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as fp:
+            for offset in sorted({0, max(0, size // 2 - chunk // 2), max(0, size - chunk)}):
+                fp.seek(offset)
+                digest.update(fp.read(chunk))
+        return digest.hexdigest()
+
+    @staticmethod
+    def get_file_identity(path:Union[Path, str]) -> dict[str, Any]:
+        """キャッシュのキーに使用するファイルの同一性を取得
+
+        Args:
+            path (Union[Path, str]): ファイルパス
+
+        Returns:
+            dict[str, Any]: サイズ、更新日時と内容のハッシュ
+        """
+        stat = os.stat(path)
+        return {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": ExportCache.get_file_hash(path),
+        }
+
+    @staticmethod
+    def evict_files(directory:Path, pattern:str, max_bytes:int, suffixes:Iterable[str]=()) -> None:
+        """合計サイズが上限に収まるまで、最も長く使われていないファイルから破棄
+
+        最後に使用した日時として更新日時を使用します。
+
+        Args:
+            directory (Path): キャッシュの保存先
+            pattern (str): 合計サイズの対象とするファイルのglobパターン
+            max_bytes (int): 合計サイズの上限(0以下で無制限)
+            suffixes (Iterable[str], optional): 対象のファイルと共に破棄する、拡張子のみが異なるファイルの拡張子. Defaults to ().
+        """
+        if max_bytes <= 0:
+            return
+
+        entries = []
+        for path in directory.glob(pattern):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            for suffix in suffixes:
+                path.with_suffix(suffix).unlink(missing_ok=True)
+            total -= size
+
+    def get_key(self, input_path:Union[Path, str], settings:dict[str, Any]) -> str:
+        """キャッシュのキーを取得
+
+        Args:
+            input_path (Union[Path, str]): 動画の入力パス
+            settings (dict[str, Any]): 出力結果に影響する設定
+
+        Returns:
+            str: キャッシュのキー
+        """
+        identity = {
+            "version": self.VERSION,
+            **self.get_file_identity(input_path),
+            "settings": settings,
+        }
+        return hashlib.blake2b(json.dumps(identity, sort_keys=True, default=str).encode(), digest_size=20).hexdigest()
+
+    def get_path(self, key:str) -> Path:
+        """キャッシュファイルのパスを取得
+
+        Args:
+            key (str): キャッシュのキー
+
+        Returns:
+            Path: キャッシュファイルのパス
+        """
+        return self.directory / f"{key}{self.SUFFIX}"
+
+    def load(self, key:str, output_path:Union[Path, str]) -> bool:
+        """キャッシュから出力先へ複製
+
+        Args:
+            key (str): キャッシュのキー
+            output_path (Union[Path, str]): GIFの出力パス
+
+        Returns:
+            bool: キャッシュに有り、出力先へ複製できた場合はTrueを返します。
+        """
+        path = self.get_path(key)
+        if not path.is_file():
+            return False
+
+        try:
+            shutil.copyfile(path, output_path)
+
+            # 最後に使用した日時として更新日時を更新します。
+            os.utime(path)
+        except OSError:
+            return False
+
+        return True
+
+    def store(self, key:str, output_path:Union[Path, str]) -> None:
+        """出力結果をキャッシュへ保存
+
+        Args:
+            key (str): キャッシュのキー
+            output_path (Union[Path, str]): GIFの出力パス
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # NOTE: 書き込み途中のファイルを読まないよう、一時ファイルへコピーしてから置き換えます。
+        path = self.get_path(key)
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        shutil.copyfile(output_path, temp_path)
+        os.replace(temp_path, path)
+
+        self.evict()
+
+    def evict(self) -> None:
+        """合計サイズが上限に収まるまで、最も長く使われていないキャッシュから破棄
+        """
+        ExportCache.evict_files(self.directory, f"*{self.SUFFIX}", self.max_bytes)
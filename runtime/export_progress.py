@@ -0,0 +1,143 @@
+import threading as th
+import time
+from dataclasses import dataclass
+from typing import Optional, Callable
+
+
+__all__ = [
+    "ExportProgress",
+    "ProgressMonitor",
+]
+
+
+@dataclass
+class ExportProgress:
+    """GIF変換の進捗
+    """
+    # 読み込んだ元動画のフレーム数
+    decoded:int
+    # 量子化を終えた出力フレーム数
+    quantized:int
+    # 書き込んだ出力フレーム数
+    written:int
+    # 書き込んだ出力フレームが表示する元動画のフレーム数
+    completed:int
+    # 出力範囲の元動画のフレーム数(見積もり)
+    total:int
+    # 直近の1秒あたりの書き込んだ元動画のフレーム数
+    fps:float
+    # 残り時間の見積もり(秒、見積もれない場合は負数)
+    eta:float
+
+    @property
+    def ratio(self) -> float:
+        """進捗率を取得
+
+        Returns:
+            float: 書き込んだ元動画のフレーム数の割合(0.0~1.0)
+        """
+        if self.total <= 0:
+            return 0.0
+        return min(1.0, self.completed / self.total)
+
+
+class ProgressMonitor:
+    """GIF変換の進捗の定期的な通知
+
+    変換処理は書き込んだフレーム数を更新するのみで、進捗の集計とコールバックは監視スレッドが一定間隔で行うため、
+    変換処理の負荷はほぼ増えません。書き込みが止まっている間も通知が続くため、受け取る側で停止を検出できます。
+    """
+    # 通知の間隔(秒)
+    INTERVAL = 0.1
+
+    def __init__(
+        self,
+        callback:Callable[[ExportProgress], None],
+        total:int,
+        get_decoded:Callable[[], int],
+        get_quantized:Callable[[], int],
+    ) -> None:
+        """コンストラクタ
+
+        Args:
+            callback (Callable[[ExportProgress], None]): 進捗のコールバック(監視スレッドから呼び出されます)
+            total (int): 出力範囲の元動画のフレーム数(見積もり)
+            get_decoded (Callable[[], int]): 読み込んだ元動画のフレーム数の取得
+            get_quantized (Callable[[], int]): 量子化を終えた出力フレーム数の取得
+        """
+        self.callback = callback
+        self.total = max(0, total)
+        self.get_decoded = get_decoded
+        self.get_quantized = get_quantized
+
+        # 書き込み側が更新するフレーム数
+        self.written = 0
+        self.completed = 0
+
+        self.__start = time.perf_counter()
+        self.__last = (self.__start, 0)
+        self.__stop = th.Event()
+        self.__thread:Optional[th.Thread] = None
+
+    def start(self) -> None:
+        """[Thread-N] 通知の開始
+        """
+        self.__start = time.perf_counter()
+        self.__last = (self.__start, 0)
+        self.__stop.clear()
+        self.__thread = th.Thread(target=self.update_progress, daemon=True)
+        self.__thread.start()
+
+    def stop(self, is_success:bool) -> None:
+        """[Thread-N] 通知の終了
+
+        Args:
+            is_success (bool): 出力の成否. 成功した場合は見積もりとの誤差を除いて完了を通知します.
+        """
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+        if is_success:
+            self.total = self.completed
+            self.callback(self.get_progress())
+
+    def get_progress(self) -> ExportProgress:
+        """現在の進捗を取得
+
+        Returns:
+            ExportProgress: 進捗
+        """
+        now, completed = time.perf_counter(), self.completed
+        last_time, last_completed = self.__last
+        self.__last = (now, completed)
+
+        fps = (completed - last_completed) / (now - last_time) if now > last_time else 0.0
+
+        # NOTE: 直近のフレームレートは変動が大きいため、残り時間は開始からの平均で見積もります。
+        elapsed = now - self.__start
+        if completed > 0 and elapsed > 0.0:
+            eta = max(0, self.total - completed) / (completed / elapsed)
+        else:
+            eta = -1.0
+
+        # NOTE: 読込スレッドは終端を検出するために最後のフレームの次も読み込むため、見積もりで制限します。
+        decoded = max(0, self.get_decoded())
+        if self.total > 0:
+            decoded = min(self.total, decoded)
+
+        return ExportProgress(
+            decoded,
+            self.get_quantized(),
+            self.written,
+            completed,
+            self.total,
+            fps,
+            eta,
+        )
+
+    def update_progress(self) -> None:
+        """[Thread-N] 進捗の定期的な通知
+        """
+        while not self.__stop.wait(self.INTERVAL):
+            self.callback(self.get_progress())
@@ -0,0 +1,272 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+from typing import Union, Optional, BinaryIO
+import numpy as np
+from runtime.export_cache import ExportCache
+
+
+__all__ = [
+    "FrameCache",
+    "FrameCacheWriter",
+    "CachedCapture",
+]
+
+
+class FrameCacheWriter:
+    """デコード済みフレームのキャッシュの書き込み
+
+    フレームを受け取るたびに一時ファイルへ追記し、commitで完成したキャッシュとして置き換えます。
+    """
+    def __init__(self, cache:"FrameCache", key:str) -> None:
+        """コンストラクタ
+
+        Args:
+            cache (FrameCache): 書き込み先のキャッシュ
+            key (str): キャッシュのキー
+        """
+        self.cache = cache
+        self.key = key
+        self.temp_path = cache.get_path(key, ".raw").with_suffix(f".{os.getpid()}.tmp")
+        self.fp:Optional[BinaryIO] = open(self.temp_path, "wb")
+        self.shape:Optional[tuple[int, ...]] = None
+        self.frames = 0
+
+    def append(self, image:np.ndarray) -> None:
+        """フレームの追記
+
+        Args:
+            image (np.ndarray): RGB変換、リサイズ後の画像(H, W, 3)
+        """
+        if self.fp is None:
+            return
+
+        # NOTE: 大きさの異なるフレームは1つの配列にできないため、キャッシュを諦めます。
+        if self.shape is None:
+            self.shape = image.shape
+        elif self.shape != image.shape:
+            self.discard()
+            return
+
+        self.fp.write(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+        self.frames += 1
+
+    def commit(self) -> None:
+        """書き込んだフレームをキャッシュとして保存
+        """
+        if self.fp is None:
+            return
+
+        fp, self.fp = self.fp, None
+        fp.close()
+        if self.frames == 0:
+            self.temp_path.unlink(missing_ok=True)
+            return
+
+        # NOTE: 配列の形状を先に書き込み、配列を置き換えた時点でキャッシュが完成します。
+        with open(self.cache.get_path(self.key, ".json"), "w") as fp:
+            json.dump({"shape": [self.frames, *self.shape]}, fp)
+        os.replace(self.temp_path, self.cache.get_path(self.key, ".raw"))
+
+        self.cache.evict()
+
+    def discard(self) -> None:
+        """書き込み途中のフレームを破棄
+        """
+        if self.fp is None:
+            return
+
+        # NOTE: 容量不足などで書き込みに失敗した後は、閉じる際の書き出しも失敗するため無視します。
+        fp, self.fp = self.fp, None
+        try:
+            fp.close()
+        except OSError:
+            pass
+        self.temp_path.unlink(missing_ok=True)
+
+
+class FrameCache:
+    """RGB変換、リサイズ後のフレームをメモリマップで読み込むディスクキャッシュ
+
+    入力動画、リサイズ後の大きさ、出力範囲をキーとし、出力範囲の全フレームを1つのuint8配列として保存します。
+    量子化の設定のみを変えて出力し直す場合は、動画のデコードを行わずにキャッシュから読み込みます。
+    合計サイズが上限を超えた場合は、最も長く使われていないものから破棄します。
+    """
+    # キャッシュの形式(保存内容が変わる変更を行った場合は更新します)
+    VERSION = 1
+
+    def __init__(self, directory:Union[Path, str], max_bytes:int) -> None:
+        """コンストラクタ
+
+        Args:
+            directory (Union[Path, str]): キャッシュの保存先
+            max_bytes (int): キャッシュの合計サイズの上限(0以下で無制限)
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def get_key(self, input_path:Union[Path, str], width:int, height:int, start_frame:int, end_frame:int) -> str:
+        """キャッシュのキーを取得
+
+        Args:
+            input_path (Union[Path, str]): 動画の入力パス
+            width (int): リサイズ後の横幅(0の場合はリサイズしません)
+            height (int): リサイズ後の縦幅(0の場合はリサイズしません)
+            start_frame (int): 出力範囲の開始フレーム
+            end_frame (int): 出力範囲の終了フレーム(含まず、-1の場合は最後まで)
+
+        Returns:
+            str: キャッシュのキー
+        """
+        identity = {
+            "version": self.VERSION,
+            **ExportCache.get_file_identity(input_path),
+            "width": width,
+            "height": height,
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+        }
+        return hashlib.blake2b(json.dumps(identity, sort_keys=True).encode(), digest_size=20).hexdigest()
+
+    def get_path(self, key:str, suffix:str) -> Path:
+        """キャッシュファイルのパスを取得
+
+        Args:
+            key (str): キャッシュのキー
+            suffix (str): 拡張子(".raw"は配列、".json"は形状)
+
+        Returns:
+            Path: キャッシュファイルのパス
+        """
+        return self.directory / f"{key}{suffix}"
+
+    def load(self, key:str) -> Optional[np.memmap]:
+        """キャッシュをメモリマップで読込
+
+        Args:
+            key (str): キャッシュのキー
+
+        Returns:
+            Optional[np.memmap]: フレームの配列(N, H, W, 3)、又はキャッシュに無い場合はNoneを返します。
+        """
+        path = self.get_path(key, ".raw")
+        try:
+            with open(self.get_path(key, ".json"), "r") as fp:
+                shape = tuple(json.load(fp)["shape"])
+            if path.stat().st_size != int(np.prod(shape)):
+                return None
+            frames = np.memmap(path, dtype=np.uint8, mode="r", shape=shape)
+
+            # 最後に使用した日時として更新日時を更新します。
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return frames
+
+    def create(self, key:str, nbytes:int) -> Optional[FrameCacheWriter]:
+        """キャッシュの書き込みを開始
+
+        Args:
+            key (str): キャッシュのキー
+            nbytes (int): 書き込む見込みのバイト数
+
+        Returns:
+            Optional[FrameCacheWriter]: 書き込み、又は上限を超える見込みの場合はNoneを返します。
+        """
+        if 0 < self.max_bytes < nbytes:
+            return None
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            return FrameCacheWriter(self, key)
+        except OSError:
+            return None
+
+    def evict(self) -> None:
+        """合計サイズが上限に収まるまで、最も長く使われていないキャッシュから破棄
+        """
+        # NOTE: 合計サイズは配列のみで数え、形状のファイルは配列と共に破棄します。
+        ExportCache.evict_files(self.directory, "*.raw", self.max_bytes, (".json",))
+
+
+class CachedCapture:
+    """キャッシュしたフレームをWithVideoCaptureと同じ手順で読み込む
+
+    読み込んだ画像はRGB変換、リサイズ済みです。フレーム番号は元動画のフレーム番号です。
+    """
+    def __init__(self, frames:np.ndarray, start_frame:int) -> None:
+        """コンストラクタ
+
+        Args:
+            frames (np.ndarray): フレームの配列(N, H, W, 3)
+            start_frame (int): 配列の先頭のフレーム番号
+        """
+        self.frames = frames
+        self.start_frame = start_frame
+        self.__position = 0
+        self.__image:Optional[np.ndarray] = None
+        self.__retval = False
+
+    @property
+    def retval(self) -> bool:
+        """最後のread結果を取得
+
+        Returns:
+            bool: 読込に成功した場合はTrueを返します。
+        """
+        return self.__retval
+
+    @property
+    def image(self) -> Optional[np.ndarray]:
+        """最後のreadで読み込んだ画像を取得
+
+        Returns:
+            Optional[np.ndarray]: 読み込みに成功した場合は画像データを返します。
+        """
+        return self.__image
+
+    @property
+    def frame(self) -> int:
+        """現在のフレーム数を取得
+
+        Returns:
+            int: 現在のフレーム数、又は一度もreadしていない場合は先頭の1つ前を返します。
+        """
+        return self.start_frame + self.__position - 1
+
+    def read(self) -> bool:
+        """読込
+
+        Returns:
+            bool: 読込結果
+        """
+        self.__retval = self.__position < len(self.frames)
+        self.__image = self.frames[self.__position] if self.__retval else None
+        self.__position += 1
+        return self.__retval
+
+    def grab(self) -> bool:
+        """画像を取り出さずにフレームを進める
+
+        Returns:
+            bool: 読込結果
+        """
+        self.__retval, self.__image = self.__position < len(self.frames), None
+        self.__position += 1
+        return self.__retval
+
+    def seek(self, frame:int) -> bool:
+        """指定フレームへ移動
+
+        Args:
+            frame (int): フレーム番号
+
+        Returns:
+            bool: 移動に成功した場合はTrueを返します。
+        """
+        if not 0 <= frame - self.start_frame <= len(self.frames):
+            return False
+        self.__position = frame - self.start_frame
+        return True
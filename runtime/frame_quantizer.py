@@ -0,0 +1,201 @@
+from typing import Optional
+import numpy as np
+from PIL import Image
+from runtime.palette_mapper import PaletteMapper
+
+
+__all__ = [
+    "FrameQuantizer",
+]
+
+
+class FrameQuantizer:
+    """フレームの量子化
+
+    量子化の種類に応じて、Pillowによる量子化、ミニバッチk-meansによる量子化、
+    共通パレットへの割り当てを切り替えます。
+    組織的ディザはいずれの場合もパレットの作成後、パレットへの割り当て時に適用します。
+    ワーカーごとに1つ作成し、量子化結果はインデックス画像とパレットとして返します。
+    NOTE: ミニバッチk-meansの初期値は直前に作成したパレットのため、フレーム間で安定させるには
+          動画読込スレッドなどでフレーム順にfit_kmeansを呼び出し、パレットをワーカーへ渡します。
+    """
+    # ミニバッチk-meansによる量子化(Pillowの量子化の種類と重複しない値)
+    MINIBATCH_KMEANS = 16
+
+    # ミニバッチk-meansの1回の更新に使用する画素数
+    KMEANS_BATCH_PIXELS = 1 << 14
+
+    # ミニバッチk-meansの既定の更新回数
+    KMEANS_ITERATIONS = 2
+
+    # 組織的ディザ(Pillowのディザの種類と重複しない値)
+    DITHER_ORDERED = 16
+
+    # 組織的ディザの閾値の振れ幅
+    ORDERED_DITHER_STRENGTH = 12.0
+
+    def __init__(
+        self,
+        method:int,
+        kmeans:int,
+        palette:Optional[np.ndarray]=None,
+        dither:int=Image.Dither.NONE,
+        colors:int=256,
+        exact:bool=False,
+    ) -> None:
+        """コンストラクタ
+
+        Args:
+            method (int): 量子化の種類
+            kmeans (int): クラスタ数(ミニバッチk-meansの場合は更新回数、0で既定値)
+            palette (Optional[np.ndarray], optional): 共通パレット(N, 3). 指定した場合は量子化せずにパレットへ割り当てます. Defaults to None.
+            dither (int, optional): ディザの種類(DITHER_ORDERED、Image.Dither.FLOYDSTEINBERG、又はImage.Dither.NONE). Defaults to Image.Dither.NONE.
+            colors (int, optional): 減色後の色数. Defaults to 256.
+            exact (bool, optional): quantizeに渡すパレットが毎フレーム異なる場合はTrueを指定します. ルックアップテーブルを作らずに割り当てます. Defaults to False.
+        """
+        self.method = method
+        self.kmeans = kmeans
+        self.palette = palette
+        self.dither = dither
+        self.colors = colors
+        self.exact = exact
+
+        # ミニバッチk-meansの初期値に使用する直前のパレット
+        self.previous_palette:Optional[np.ndarray] = None
+
+    def quantize(self, image:np.ndarray, palette:Optional[np.ndarray]=None) -> tuple[np.ndarray, np.ndarray]:
+        """画像の量子化
+
+        Args:
+            image (np.ndarray): 入力画像(H, W, 3)
+            palette (Optional[np.ndarray], optional): フレームごとのパレット(N, 3). 指定した場合は共通パレットより優先して割り当てます. Defaults to None.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: インデックス画像(H, W)とパレット(N, 3)
+        """
+        if palette is not None:
+            is_exact = self.exact
+        else:
+            palette, is_exact = self.palette, False
+        if palette is not None:
+            if self.dither == Image.Dither.FLOYDSTEINBERG:
+                return PaletteMapper.map_floyd_steinberg(image, palette), palette
+            if self.dither == self.DITHER_ORDERED:
+                image = PaletteMapper.dither_ordered(image, self.ORDERED_DITHER_STRENGTH)
+            if is_exact:
+                return PaletteMapper.map_exact(image, palette), palette
+            return PaletteMapper.map(image, palette), palette
+
+        # NOTE: Pillowの量子化はパレットを指定しない場合にディザを適用しないため、ディザを指定した場合は
+        #       パレットの作成のみを行い、パレットへの割り当て時にディザを適用します。
+        if self.method == self.MINIBATCH_KMEANS:
+            palette = self.fit_kmeans(image)
+        elif self.dither in (self.DITHER_ORDERED, Image.Dither.FLOYDSTEINBERG):
+            palette = FrameQuantizer.image_quantize_palette(image, colors=self.colors, method=self.method, kmeans=self.kmeans)[1]
+        else:
+            return FrameQuantizer.image_quantize_palette(image, colors=self.colors, method=self.method, kmeans=self.kmeans)
+
+        if self.dither == Image.Dither.FLOYDSTEINBERG:
+            return PaletteMapper.map_floyd_steinberg(image, palette), palette
+
+        # NOTE: フレームごとのパレットはルックアップテーブルを使い回せないため、重複を除いた色で割り当てます。
+        if self.dither == self.DITHER_ORDERED:
+            image = PaletteMapper.dither_ordered(image, self.ORDERED_DITHER_STRENGTH)
+        return PaletteMapper.map_exact(image, palette), palette
+
+    def fit_kmeans(self, image:np.ndarray) -> np.ndarray:
+        """ミニバッチk-meansによるパレットの作成
+
+        無作為に抜き出した画素でクラスタ中心を更新し、クラスタ中心をパレットとします。
+        クラスタ中心の初期値には直前に作成したパレットを使用するため、
+        フレーム順に呼び出すと少ない更新回数で収束し、パレットもフレーム間で安定します。
+
+        Args:
+            image (np.ndarray): 入力画像(H, W, 3)
+
+        Returns:
+            np.ndarray: パレット(N, 3)
+        """
+        pixels = image.reshape(-1, 3)
+        iterations = self.kmeans if self.kmeans > 0 else self.KMEANS_ITERATIONS
+
+        # NOTE: 毎フレーム同じ位置の画素を抜き出すよう、乱数は固定のシードで初期化します。
+        rng = np.random.default_rng(0)
+        batch_pixels = min(len(pixels), self.KMEANS_BATCH_PIXELS)
+
+        # 直前のパレットが無い場合はメディアンカットで初期値を作成します。
+        if self.previous_palette is None:
+            centers = PaletteMapper.build(pixels[rng.integers(0, len(pixels), batch_pixels)], self.colors)
+        else:
+            centers = self.previous_palette
+        centers = centers.astype(np.float32)
+        counts = np.zeros(len(centers), dtype=np.float32)
+
+        for _ in range(iterations):
+            batch = pixels[rng.integers(0, len(pixels), batch_pixels)].astype(np.float32)
+            labels = PaletteMapper.nearest(batch, centers)
+
+            # NOTE: クラスタ中心はそれまでに割り当てられた画素の平均となるよう、割り当て数に応じて更新します。
+            sizes = np.bincount(labels, minlength=len(centers)).astype(np.float32)
+            sums = np.stack([np.bincount(labels, weights=batch[:, c], minlength=len(centers)) for c in range(3)], axis=1)
+            counts += sizes
+            assigned = sizes > 0
+            centers[assigned] += (sums[assigned] - sizes[assigned, None] * centers[assigned]) / counts[assigned, None]
+
+        palette = np.clip(np.rint(centers), 0, 255).astype(np.uint8)
+        self.previous_palette = palette
+        return palette
+
+    @staticmethod
+    def build_palette(pixels:np.ndarray, method:int, kmeans:int, colors:int=256) -> np.ndarray:
+        """画素の集合からパレットを作成
+
+        Args:
+            pixels (np.ndarray): 画素(N, 3)
+            method (int): 量子化の種類
+            kmeans (int): クラスタ数
+            colors (int, optional): パレットの色数. Defaults to 256.
+
+        Returns:
+            np.ndarray: パレット(colors, 3)
+        """
+        # NOTE: ミニバッチk-meansの場合は、画素を縦1列の画像として扱います。
+        if method == FrameQuantizer.MINIBATCH_KMEANS:
+            return FrameQuantizer(method, kmeans, colors=colors).fit_kmeans(pixels.reshape(-1, 1, 3))
+
+        # NOTE: 量子化なしでもパレットには減色が必要なため、MEDIANCUTで作成します。
+        if method == -1:
+            method = Image.Quantize.MEDIANCUT
+
+        return PaletteMapper.build(pixels, colors, method, kmeans)
+
+    @staticmethod
+    def image_quantize_palette(
+        image:np.ndarray,
+        colors:int=256,
+        method:int=Image.Quantize.MEDIANCUT,
+        kmeans:int=0,
+        dither:int=Image.Dither.NONE,
+        mode:str="RGB",
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Pillowによる画像の量子化
+
+        量子化しない場合もGIFに書き込めるよう適応パレットへ変換されます。
+
+        Args:
+            image (np.ndarray): 入力画像(RGB配置を想定)
+            colors (int, optional): 減色後の色数. Defaults to 256.
+            method (int, optional): 量子化の種類. Defaults to Image.Quantize.MEDIANCUT.
+            kmeans (int, optional): クラスタ数. Defaults to 0.
+            dither (int, optional): ディザの種類. Defaults to Image.Dither.NONE.
+            mode (str, optional): 入力画像の形式. Defaults to "RGB".
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: インデックス画像(H, W)とパレット(N, 3)
+        """
+        image:Image.Image = Image.fromarray(image, mode=mode)
+        if method != -1:
+            image = image.quantize(colors=colors, method=method, kmeans=kmeans, dither=dither)
+        else:
+            image = image.convert("P", palette=Image.Palette.ADAPTIVE, colors=colors)
+        return np.asarray(image), np.asarray(image.getpalette("RGB"), dtype=np.uint8).reshape(-1, 3)
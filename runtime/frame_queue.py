@@ -0,0 +1,310 @@
+import queue
+import threading as th
+from multiprocessing import shared_memory
+from typing import Any, Optional
+import numpy as np
+
+
+__all__ = [
+    "FrameReorderBuffer",
+    "BoundedFrameQueue",
+    "SharedFrameRing",
+]
+
+
+class FrameReorderBuffer:
+    """フレーム番号順に取り出すための並び替えバッファ
+
+    ワーカーから順不同に届いた加工結果を保持し、連続したフレームから順に取り出します。
+    保持するフレームは取り出し待ちのフレーム番号からwindow枚までに制限され、
+    範囲外のフレームをputしたワーカーは範囲内に入るまで待機します。
+    閉じた後は加工結果を破棄し、待機中のputとgetも直ちに戻るため、途中で処理を打ち切る合図として使えます。
+    """
+    def __init__(self, window:int, start:int=0) -> None:
+        """コンストラクタ
+
+        Args:
+            window (int): 並び替え窓の大きさ
+            start (int, optional): 最初に取り出すフレーム番号. Defaults to 0.
+        """
+        self.window = max(1, window)
+        self.__next = start
+        self.__received = 0
+        self.__closed = False
+        self.__items:dict[int, Any] = {}
+        self.__condition = th.Condition()
+
+    @property
+    def next(self) -> int:
+        """次に取り出すフレーム番号を取得
+
+        Returns:
+            int: 次に取り出すフレーム番号
+        """
+        return self.__next
+
+    @property
+    def received(self) -> int:
+        """届いた加工結果の数を取得
+
+        Returns:
+            int: 終了合図(None)を除いた加工結果の数
+        """
+        return self.__received
+
+    @property
+    def closed(self) -> bool:
+        """閉じているかを取得
+
+        Returns:
+            bool: 閉じている場合はTrueを返します。
+        """
+        return self.__closed
+
+    def put(self, values:tuple[int, Any], block:bool=True) -> bool:
+        """加工結果の追加
+
+        キューと同じく(フレーム番号, 加工結果)を受け取ります。
+
+        閉じている場合は破棄します。
+
+        Args:
+            values (tuple[int, Any]): フレーム番号と加工結果
+            block (bool, optional): 範囲外のフレームの場合に範囲内に入るまで待機するか. Defaults to True.
+
+        Returns:
+            bool: 待機しない場合に範囲外で追加できなかった場合はFalse、それ以外はTrueを返します。
+        """
+        frame, item = values
+        with self.__condition:
+            if block:
+                self.__condition.wait_for(lambda: self.__closed or frame < self.__next + self.window)
+            elif not self.__closed and frame >= self.__next + self.window:
+                return False
+            if self.__closed:
+                return True
+            self.__items[frame] = item
+            if item is not None:
+                self.__received += 1
+            self.__condition.notify_all()
+            return True
+
+    def get(self) -> Any:
+        """次のフレームの取り出し
+
+        次のフレームが届くまで待機します。
+
+        Returns:
+            Any: 加工結果、又は閉じている場合はNone
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__closed or self.__next in self.__items)
+            if self.__closed:
+                return None
+            item = self.__items.pop(self.__next)
+            self.__next += 1
+            self.__condition.notify_all()
+            return item
+
+    def close(self) -> None:
+        """保持している加工結果を破棄して閉じる
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__items.clear()
+            self.__condition.notify_all()
+
+
+class BoundedFrameQueue:
+    """処理待ちの画像の枚数とバイト数を制限するキュー
+
+    上限に達している間はputが待機するため、読込側が量子化側を追い越してメモリを使い切ることを防ぎます。
+    Noneなどの画像を含まない値は上限の対象外です。
+    """
+    def __init__(self, queue:Any, max_frames:int=0, max_bytes:int=0) -> None:
+        """コンストラクタ
+
+        Args:
+            queue (Any): 内部で使用するキュー
+            max_frames (int, optional): 処理待ちの画像の最大枚数(0以下で無制限). Defaults to 0.
+            max_bytes (int, optional): 処理待ちの画像の最大バイト数(0以下で無制限). Defaults to 0.
+        """
+        self.queue = queue
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.__frames = 0
+        self.__bytes = 0
+        self.__condition = th.Condition()
+
+    @property
+    def frames(self) -> int:
+        """処理待ちの画像の枚数を取得
+
+        Returns:
+            int: 処理待ちの画像の枚数
+        """
+        return self.__frames
+
+    @staticmethod
+    def get_nbytes(values:Any) -> int:
+        """上限の対象となるバイト数を取得
+
+        Args:
+            values (Any): キューに積む値
+
+        Returns:
+            int: 画像のバイト数、又は画像を含まない場合は0を返します。
+        """
+        if isinstance(values, tuple) and len(values) >= 2 and hasattr(values[1], "nbytes"):
+            return values[1].nbytes
+        return 0
+
+    def is_full(self, nbytes:int) -> bool:
+        """上限に達しているかを取得
+
+        バイト数の上限を超える画像でも、処理待ちが空であれば受け付けます。
+
+        Args:
+            nbytes (int): 追加する画像のバイト数
+
+        Returns:
+            bool: 上限に達している場合はTrueを返します。
+        """
+        if 0 < self.max_frames <= self.__frames:
+            return True
+        if 0 < self.max_bytes < self.__bytes + nbytes and self.__frames > 0:
+            return True
+        return False
+
+    def put(self, values:Any) -> None:
+        """値の追加
+
+        Args:
+            values (Any): キューに積む値
+        """
+        if (nbytes:=self.get_nbytes(values)) > 0:
+            with self.__condition:
+                self.__condition.wait_for(lambda: not self.is_full(nbytes))
+                self.__frames += 1
+                self.__bytes += nbytes
+        self.queue.put(values)
+
+    def get(self) -> Any:
+        """値の取り出し
+
+        Returns:
+            Any: キューから取り出した値
+        """
+        values = self.queue.get()
+        if (nbytes:=self.get_nbytes(values)) > 0:
+            with self.__condition:
+                self.__frames -= 1
+                self.__bytes -= nbytes
+                self.__condition.notify_all()
+        return values
+
+
+class SharedFrameRing:
+    """共有メモリ上のリングバッファを介してプロセスへ画像を受け渡すキュー
+
+    画像は空きスロットへコピーされ、キューにはフレーム番号とスロット番号のみを積むため、
+    画像自体はシリアライズされません。空きスロットが無い間はputが待機します。
+    プロセスの引数として渡すと、子プロセス側で同じ共有メモリに接続されます。
+    """
+    def __init__(self, context:Any, slots:int, slot_bytes:int) -> None:
+        """コンストラクタ
+
+        Args:
+            context (Any): multiprocessingのコンテキスト
+            slots (int): スロット数
+            slot_bytes (int): 1スロットあたりのバイト数
+        """
+        self.slots = max(1, slots)
+        self.slot_bytes = max(1, slot_bytes)
+        self.shm:Optional[shared_memory.SharedMemory] = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self.task_queue = context.Queue()
+        self.free_queue = context.Queue()
+        for slot in range(self.slots):
+            self.free_queue.put(slot)
+
+    def view(self, slot:int, shape:tuple[int, ...]) -> np.ndarray:
+        """スロットの画像を取得
+
+        Args:
+            slot (int): スロット番号
+            shape (tuple[int, ...]): 画像の形状
+
+        Returns:
+            np.ndarray: 共有メモリを参照する画像
+        """
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def put(self, values:Any) -> None:
+        """[親プロセス] 画像の追加
+
+        画像に続く値はそのままキューに積まれます。
+
+        Args:
+            values (Any): フレーム番号と画像(と付加情報)、又は終了合図のNone
+        """
+        if values is None:
+            self.task_queue.put(None)
+            return
+
+        frame, image = values[:2]
+        slot = self.free_queue.get()
+        self.view(slot, image.shape)[...] = image
+        self.task_queue.put((frame, slot, image.shape) + tuple(values[2:]))
+
+    def get(self) -> Optional[tuple[Any, ...]]:
+        """[子プロセス] 画像の取り出し
+
+        取り出したスロットは処理後にreleaseで返却してください。
+
+        Returns:
+            Optional[tuple[Any, ...]]: フレーム番号、スロット番号、画像の形状(と付加情報)、又は終了合図のNone
+        """
+        return self.task_queue.get()
+
+    def clear(self) -> None:
+        """[親プロセス] 処理待ちの画像の破棄
+
+        取り出される前の画像のスロットを返却するため、空きを待っているputが直ちに戻ります。
+        処理中の画像はプロセスが返却するまで解放されません。
+        NOTE: 取り出した終了合図は積み直し、プロセスが終了できるようにします。
+        """
+        stops = 0
+        while True:
+            try:
+                values = self.task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if values is None:
+                stops += 1
+            else:
+                self.free_queue.put(values[1])
+        for _ in range(stops):
+            self.task_queue.put(None)
+
+    def release(self, slot:int) -> None:
+        """[子プロセス] スロットの返却
+
+        Args:
+            slot (int): スロット番号
+        """
+        self.free_queue.put(slot)
+
+    def detach(self) -> None:
+        """[子プロセス] 共有メモリから切断
+        """
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+    def close(self) -> None:
+        """[親プロセス] 共有メモリの破棄
+        """
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
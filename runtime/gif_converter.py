@@ -1,11 +1,25 @@
 from pathlib import Path
+import io
+import math
 import multiprocessing as mp
+import queue
+import sys
 import threading as th
+import time
 from typing import Union, Optional, Callable, Any
 import cv2
 import numpy as np
-from PIL import Image
-from dataclasses import dataclass
+from PIL import Image, ImageSequence
+from dataclasses import dataclass, asdict, replace
+from runtime.export_cache import ExportCache
+from runtime.frame_cache import FrameCache, FrameCacheWriter, CachedCapture
+from runtime.frame_queue import FrameReorderBuffer, BoundedFrameQueue, SharedFrameRing
+from runtime.frame_quantizer import FrameQuantizer
+from runtime.gif_writer import GIFWriter
+from runtime.scene_detector import SceneDetector
+from runtime.pipeline_tracer import PipelineTracer
+from runtime.export_progress import ExportProgress, ProgressMonitor
+from runtime.worker_tuner import WorkerTuner
 
 
 __all__ = [
@@ -17,6 +31,9 @@ __all__ = [
 class WithVideoCapture:
     """with対応なcv2.VideoCapture
     """
+    # advance_toでシークするフレーム間隔(未満の場合は読み飛ばします)
+    SEEK_FRAMES = 300
+
     def __init__(self, filename:str) -> None:
         """コンストラクタ
 
@@ -121,6 +138,52 @@ class WithVideoCapture:
         self.__frame += 1
         return self.retval
 
+    def grab(self) -> bool:
+        """画像を取り出さずにフレームを進める
+
+        Returns:
+            bool: 読込結果
+        """
+        self.__retval, self.__image = self.cap.grab(), None
+        self.__frame += 1
+        return self.retval
+
+    def seek(self, frame:int) -> bool:
+        """指定フレームへ移動
+
+        次のreadで指定フレームが読み込まれます。
+
+        Args:
+            frame (int): フレーム番号
+
+        Returns:
+            bool: 移動に成功した場合はTrueを返します。
+        """
+        if not self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame):
+            return False
+        self.__frame = frame - 1
+        return True
+
+    def advance_to(self, frame:int) -> bool:
+        """指定フレームまで進める
+
+        次のreadで指定フレームが読み込まれます。
+        NOTE: シークはキーフレームからのデコードを伴うため、SEEK_FRAMES未満の近いフレームは読み飛ばします。
+
+        Args:
+            frame (int): 現在より後のフレーム番号
+
+        Returns:
+            bool: 移動に成功した場合はTrueを返します。
+        """
+        if frame - self.frame > self.SEEK_FRAMES:
+            if not self.seek(frame):
+                return False
+        while self.frame + 1 < frame:
+            if not self.grab():
+                return False
+        return True
+
 
 @dataclass
 class GIFExportInfo:
@@ -132,7 +195,44 @@ class GIFExportInfo:
     quantize_method:int
     quantize_kmeans:int
     play_speed:float
+    # 使用するコア数(0以下で使用できるコア数)
     num_workers:int
+    # 処理待ちの画像の最大枚数(0以下でワーカー数に応じた自動設定)
+    max_inflight_frames:int = 0
+    # 処理待ちの画像の最大バイト数(0以下で無制限)
+    max_inflight_bytes:int = 0
+    # 量子化処理の実行方式("thread" or "process")
+    backend:str = "thread"
+    # 動画全体で共通のパレットを使用するか
+    global_palette:bool = False
+    # 前フレームからの変化領域のみを書き込むか
+    delta_encoding:bool = True
+    # 前フレームと同一とみなす画素値の最大差(0で完全一致のみ、負数で無効)
+    dedupe_threshold:int = 0
+    # 出力するGIFのフレームレート(0以下で元動画のフレームレート)
+    target_fps:float = 0.0
+    # 出力範囲の開始と終了(秒、負数で未指定)
+    start_time:float = -1.0
+    end_time:float = -1.0
+    # 出力範囲の開始と終了(フレーム番号、負数で未指定、秒より優先されます)
+    start_frame:int = -1
+    end_frame:int = -1
+    # ショット内でパレットを使い回すシーン切り替えの閾値(ヒストグラムの距離、負数で無効)
+    scene_threshold:float = -1.0
+    # ディザの種類(FrameQuantizer.DITHER_ORDERED、Image.Dither.FLOYDSTEINBERG、又はImage.Dither.NONE)
+    quantize_dither:int = Image.Dither.NONE
+    # 減色後の色数
+    quantize_colors:int = 256
+    # 出力ファイルサイズの上限(バイト、0以下で無効)
+    target_size:int = 0
+    # 出力結果のキャッシュの保存先(空文字で無効)
+    cache_dir:str = ""
+    # 出力結果のキャッシュの合計サイズの上限(0以下で無制限)
+    cache_max_bytes:int = 1 << 30
+    # デコード済みフレームのキャッシュの保存先(空文字で無効)
+    frame_cache_dir:str = ""
+    # デコード済みフレームのキャッシュの合計サイズの上限(0以下で無制限)
+    frame_cache_max_bytes:int = 4 << 30
 
     def __post_init__(self) -> None:
         if isinstance(self.input_path, Path):
@@ -141,7 +241,86 @@ class GIFExportInfo:
         if isinstance(self.output_path, Path):
             self.output_path = str(self.output_path)
 
-        self.num_workers = max(1, self.num_workers)
+        if isinstance(self.cache_dir, Path):
+            self.cache_dir = str(self.cache_dir)
+
+        if isinstance(self.frame_cache_dir, Path):
+            self.frame_cache_dir = str(self.frame_cache_dir)
+
+        if self.num_workers <= 0:
+            self.num_workers = WorkerTuner.get_cpu_count()
+
+        if self.max_inflight_frames <= 0:
+            self.max_inflight_frames = self.num_workers * GIFConverter.INFLIGHT_FRAMES_PER_WORKER
+
+    def get_cache_settings(self) -> dict[str, Any]:
+        """出力結果に影響する設定を取得
+
+        入出力パス、並列処理とキャッシュの設定は出力結果に影響しないため除きます。
+
+        Returns:
+            dict[str, Any]: 出力結果のキャッシュのキーに使用する設定
+        """
+        settings = asdict(self)
+        for name in ("input_path", "output_path", "num_workers", "max_inflight_frames", "max_inflight_bytes", "backend", "cache_dir", "cache_max_bytes", "frame_cache_dir", "frame_cache_max_bytes"):
+            settings.pop(name)
+        return settings
+
+    def get_frame_range(self, fps:float) -> tuple[int, int]:
+        """出力範囲をフレーム番号で取得
+
+        秒で指定された範囲は、開始時刻を含むフレームから終了時刻より前に始まるフレームまでとします。
+
+        Args:
+            fps (float): 元動画のフレームレート
+
+        Returns:
+            tuple[int, int]: 開始フレーム番号と終了フレーム番号(終了フレームは含まず、-1の場合は最後まで)
+        """
+        if self.start_frame >= 0:
+            start = self.start_frame
+        elif self.start_time >= 0.0 and fps > 0.0:
+            start = math.floor(self.start_time * fps)
+        else:
+            start = 0
+
+        if self.end_frame >= 0:
+            end = self.end_frame
+        elif self.end_time >= 0.0 and fps > 0.0:
+            end = math.ceil(self.end_time * fps)
+        else:
+            end = -1
+
+        return start, end
+
+
+@dataclass
+class GIFExportStages:
+    """前回のGIF変換の設定と段階ごとの中間結果
+
+    デコード、リサイズ済みのフレームはデコード済みフレームのキャッシュ、
+    量子化結果はこのクラス、圧縮結果は出力したGIFとして保持し、設定が変わった段階以降のみをやり直します。
+    """
+    # 前回の出力情報(出力ファイルサイズの上限に合わせて変更する前の設定)
+    info:GIFExportInfo
+    # 入力動画のサイズと更新日時
+    input_stat:tuple[int, int]
+    # 出力したGIFのサイズと更新日時
+    output_stat:tuple[int, int]
+    # 元動画のフレームレート
+    fps:float
+    # 出力フレームごとの元動画のフレーム数
+    repeats:list[int]
+    # 動画全体で共通のパレット
+    palette:Optional[np.ndarray]
+    # 出力フレームごとの量子化結果(保持する上限を超えた場合はNone)
+    frames:Optional[list[tuple[np.ndarray, np.ndarray]]]
+
+
+class GIFExportCancelled(Exception):
+    """GIF変換の中止
+    """
+    pass
 
 
 class GIFConverter:
@@ -150,12 +329,75 @@ class GIFConverter:
     # GIF変換可能な拡張子
     SUPPORT_SUFFIXES = tuple([".mp4", ".avi"])
 
+    # ワーカー1つあたりの並び替え窓の大きさ
+    REORDER_WINDOW_PER_WORKER = 2
+
+    # 並び替え窓の範囲外の量子化プロセスの結果を保留している間に、窓の移動を確認する間隔(秒)
+    PROCESS_RESULT_INTERVAL = 0.01
+
+    # 失敗時に量子化プロセスの終了を待つ時間(秒、超えた場合は強制終了します)
+    PROCESS_JOIN_TIMEOUT = 5.0
+
+    # ワーカー1つあたりの処理待ちの画像の枚数
+    INFLIGHT_FRAMES_PER_WORKER = 2
+
+    # 使用できるコア数からワーカー数を自動で決めることを表すワーカー数
+    AUTO_WORKERS = 0
+
+    # 減色後の最大色数(GIFのカラーテーブルの最大色数)
+    MAX_QUANTIZE_COLORS = 256
+
+    # 量子化処理の実行方式
+    BACKEND_THREAD = "thread"
+    BACKEND_PROCESS = "process"
+
+    # 共通パレットの作成に使用するフレーム数と画素数
+    GLOBAL_PALETTE_SAMPLE_FRAMES = 32
+    GLOBAL_PALETTE_SAMPLE_PIXELS = 1 << 18
+
+    # 出力サイズの予測に使用する区間数と、1区間あたりの連続したフレーム数
+    TARGET_SIZE_SEGMENTS = 3
+    TARGET_SIZE_SEGMENT_FRAMES = 5
+
+    # 出力サイズの上限に収めるために試すリサイズ(指定値に対する倍率)、色数、フレームレートの候補
+    TARGET_SIZE_RESIZES = (1.0, 0.85, 0.7, 0.6, 0.5, 0.4, 0.3, 0.25)
+    TARGET_SIZE_COLORS = (256, 128, 64)
+    TARGET_SIZE_FPS = (20.0, 15.0, 10.0)
+
+    # 予測の誤差を見込んだ出力サイズの上限に対する割合
+    TARGET_SIZE_MARGIN = 0.9
+
+    # 再出力用に保持する量子化結果の最大バイト数
+    STAGE_FRAMES_MAX_BYTES = 1 << 28
+
+    # 量子化結果を再利用できる書き込み時のみの設定と、その内で表示時間のみに影響する設定
+    STAGE_WRITE_SETTINGS = frozenset(["play_speed", "delta_encoding"])
+    STAGE_TIMING_SETTINGS = frozenset(["play_speed"])
+
     def __init__(self) -> None:
         """コンストラクタ
         """
         # GIF変換と出力を行うスレッド
         self.thread:th.Thread = None
 
+        # 前回のGIF変換の設定と中間結果
+        self.stages:Optional[GIFExportStages] = None
+
+        # 再出力用に量子化結果を保持するか(最大STAGE_FRAMES_MAX_BYTESまで)
+        # NOTE: 保持しない場合も、再生速度のみの変更は出力したGIFの書き換えで再利用します。
+        self.retain_frames = False
+
+        # ステージごとの処理時間の記録(Noneで記録しません)
+        # NOTE: GIF変換の開始前に設定すると、変換中の処理時間が記録されます。
+        self.tracer:Optional[PipelineTracer] = None
+
+        # GIF変換の中止要求
+        # NOTE: GIF出力後のコールバックで、失敗と中止を区別するために参照できます。
+        self.cancelled = th.Event()
+
+        # 実行中のGIF変換の量子化処理の出力先(閉じると読込、ワーカー、書き込みが打ち切られます)
+        self.output_queue:Optional[FrameReorderBuffer] = None
+
     @staticmethod
     def is_valid_path(in_path:Any, is_file:bool, suffix:Optional[Union[str, tuple[str, ...]]]) -> bool:
         """パスの有効性チェック
@@ -183,6 +425,17 @@ class GIFConverter:
 
         return True
 
+    @staticmethod
+    def is_gui_attached() -> bool:
+        """GUIが立ち上がっているかを取得します。
+
+        Returns:
+            bool: tkinterのルートウィンドウが存在する場合はTrueを返します。
+        """
+        if (tkinter:=sys.modules.get("tkinter")) is None:
+            return False
+        return getattr(tkinter, "_default_root", None) is not None
+
     def is_thread_ready(self) -> bool:
         """スレッドの立ち上げ準備が整っているかを取得します。
 
@@ -195,6 +448,24 @@ class GIFConverter:
         # スレッドが生きている場合は準備完了していません。
         return not self.thread.is_alive()
 
+    def cancel(self) -> bool:
+        """[MainThread] 実行中のGIF変換の中止
+
+        読込を止めて処理待ちのフレームを破棄し、ワーカーを終了させ、書きかけの出力を削除します。
+        中止を終えるとGIF出力後のコールバックに失敗として渡され、cancelledがセットされたままになります。
+        NOTE: 中止の完了は待たずに戻ります。
+
+        Returns:
+            bool: 実行中のGIF変換に中止を要求した場合はTrueを返します。
+        """
+        if self.is_thread_ready():
+            return False
+
+        self.cancelled.set()
+        if (output_queue:=self.output_queue) is not None:
+            output_queue.close()
+        return True
+
     def export(
         self,
         input_path:Union[Path, str],
@@ -206,6 +477,26 @@ class GIFConverter:
         num_workers:int,
         quantized_callback:Optional[Callable[[list[Image.Image], float], None]] = None,
         exported_callback:Optional[Callable[[bool, str], None]] = None,
+        max_inflight_frames:int = 0,
+        max_inflight_bytes:int = 0,
+        backend:str = BACKEND_THREAD,
+        global_palette:bool = False,
+        delta_encoding:bool = True,
+        dedupe_threshold:int = 0,
+        target_fps:float = 0.0,
+        start_time:float = -1.0,
+        end_time:float = -1.0,
+        start_frame:int = -1,
+        end_frame:int = -1,
+        scene_threshold:float = -1.0,
+        quantize_dither:int = Image.Dither.NONE,
+        quantize_colors:int = 256,
+        target_size:int = 0,
+        cache_dir:Union[Path, str] = "",
+        cache_max_bytes:int = 1 << 30,
+        frame_cache_dir:Union[Path, str] = "",
+        frame_cache_max_bytes:int = 4 << 30,
+        progress_callback:Optional[Callable[[ExportProgress], None]] = None,
     ) -> bool:
         """[MainThread] GIF変換と出力
 
@@ -216,9 +507,29 @@ class GIFConverter:
             quantize_method (int): 量子化の種類
             quantize_kmeans (int): クラスタ数
             play_speed (float): 再生速度
-            num_workers (int): 量子化処理のワーカー数
+            num_workers (int): 使用するコア数. 量子化とLZW圧縮のワーカー数は処理時間と処理待ちに応じて配分されます. AUTO_WORKERS(0)で使用できるコア数.
             quantized_callback (Optional[Callable[[list[Image.Image], float], None]], optional): 量子化後のコールバック. Defaults to None.
             exported_callback (Optional[Callable[[bool, str], None]], optional): GIF出力後のコールバック. Defaults to None.
+            max_inflight_frames (int, optional): 処理待ちの画像の最大枚数(0以下でワーカー数に応じた自動設定). Defaults to 0.
+            max_inflight_bytes (int, optional): 処理待ちの画像の最大バイト数(0以下で無制限). Defaults to 0.
+            backend (str, optional): 量子化処理の実行方式. GUIが立ち上がっている場合は常にスレッドで処理します. Defaults to BACKEND_THREAD.
+            global_palette (bool, optional): 動画全体で共通のパレットを使用する場合はTrueを指定します. Defaults to False.
+            delta_encoding (bool, optional): 前フレームからの変化領域のみを書き込む場合はTrueを指定します. Defaults to True.
+            dedupe_threshold (int, optional): 前フレームと同一とみなす画素値の最大差(0で完全一致のみ、負数で無効). Defaults to 0.
+            target_fps (float, optional): 出力するGIFのフレームレート(0以下で元動画のフレームレート). Defaults to 0.0.
+            start_time (float, optional): 出力範囲の開始(秒、負数で先頭から). Defaults to -1.0.
+            end_time (float, optional): 出力範囲の終了(秒、負数で最後まで). Defaults to -1.0.
+            start_frame (int, optional): 出力範囲の開始フレーム(負数で未指定、start_timeより優先されます). Defaults to -1.
+            end_frame (int, optional): 出力範囲の終了フレーム(含まず、負数で未指定、end_timeより優先されます). Defaults to -1.
+            scene_threshold (float, optional): シーン切り替えとみなすヒストグラムの距離(0.0~1.0). ショット内のフレームは先頭フレームのパレットを使い回します. 負数で無効. Defaults to -1.0.
+            quantize_dither (int, optional): ディザの種類(FrameQuantizer.DITHER_ORDERED、Image.Dither.FLOYDSTEINBERG、又はImage.Dither.NONE). Defaults to Image.Dither.NONE.
+            quantize_colors (int, optional): 減色後の色数(1~MAX_QUANTIZE_COLORS). Defaults to 256.
+            target_size (int, optional): 出力ファイルサイズの上限(バイト). 指定した場合はリサイズ、色数、フレームレートを上限に収まるよう下げて出力します. 0以下で無効. Defaults to 0.
+            cache_dir (Union[Path, str], optional): 出力結果のキャッシュの保存先. 同じ動画と設定の出力はキャッシュから複製します. 空文字で無効. Defaults to "".
+            cache_max_bytes (int, optional): 出力結果のキャッシュの合計サイズの上限(0以下で無制限). Defaults to 1 << 30.
+            frame_cache_dir (Union[Path, str], optional): デコード済みフレームのキャッシュの保存先. 同じ動画、リサイズ、出力範囲の出力はデコードせずにキャッシュから読み込みます. 空文字で無効. Defaults to "".
+            frame_cache_max_bytes (int, optional): デコード済みフレームのキャッシュの合計サイズの上限(0以下で無制限). Defaults to 4 << 30.
+            progress_callback (Optional[Callable[[ExportProgress], None]], optional): 変換中に一定間隔で呼び出される進捗のコールバック. Defaults to None.
 
         Returns:
             bool: スレッドの立ち上げに成功した場合はTrueを返します。
@@ -235,7 +546,31 @@ class GIFConverter:
         if not GIFConverter.is_valid_path(output_path, False, ".gif"):
             return False
 
+        # 量子化処理の実行方式を確認
+        if backend not in (self.BACKEND_THREAD, self.BACKEND_PROCESS):
+            return False
+
+        # 減色後の色数を確認
+        # NOTE: 範囲外の色数は全てのワーカーの量子化が失敗するため、変換を始める前に弾きます。
+        if not 1 <= quantize_colors <= self.MAX_QUANTIZE_COLORS:
+            return False
+
+        # 出力範囲が空でないかを確認
+        # NOTE: 開始が動画の長さを超える場合は動画を開くまで分からないため、出力フレームが無い場合に失敗とします。
+        if start_frame >= 0 and end_frame >= 0:
+            if end_frame <= start_frame:
+                return False
+        elif start_frame < 0 and end_frame < 0 and start_time >= 0.0 and end_time >= 0.0:
+            if end_time <= start_time:
+                return False
+
+        # NOTE: プロセスはtkinterとの相性問題があるため、GUIが立ち上がっている場合はスレッドで処理します。
+        if backend == self.BACKEND_PROCESS and GIFConverter.is_gui_attached():
+            backend = self.BACKEND_THREAD
+
         # GIF変換スレッドの立ち上げ
+        self.cancelled.clear()
+        self.output_queue = None
         self.thread = th.Thread(
             target=self.thread_export,
             args=(
@@ -247,9 +582,29 @@ class GIFConverter:
                     quantize_kmenas,
                     play_speed,
                     num_workers,
+                    max_inflight_frames,
+                    max_inflight_bytes,
+                    backend,
+                    global_palette,
+                    delta_encoding,
+                    dedupe_threshold,
+                    target_fps,
+                    start_time,
+                    end_time,
+                    start_frame,
+                    end_frame,
+                    scene_threshold,
+                    quantize_dither,
+                    quantize_colors,
+                    target_size,
+                    cache_dir,
+                    cache_max_bytes,
+                    frame_cache_dir,
+                    frame_cache_max_bytes,
                 ),
                 quantized_callback,
                 exported_callback,
+                progress_callback,
             ),
             daemon=True,
         )
@@ -262,6 +617,7 @@ class GIFConverter:
         info:GIFExportInfo,
         quantized_callback:Optional[Callable[[list[Image.Image], float], None]] = None,
         exported_callback:Optional[Callable[[bool, str], None]] = None,
+        progress_callback:Optional[Callable[[ExportProgress], None]] = None,
     ) -> None:
         """[Thread-N] GIF変換と出力
 
@@ -269,165 +625,1244 @@ class GIFConverter:
             info (GIFExportInfo): GIF変換、出力情報
             quantized_callback (Optional[Callable[[list[Image.Image], float], None]], optional): 量子化後のコールバック. Defaults to None.
             exported_callback (Optional[Callable[[bool, str], None]], optional): GIF出力後のコールバック. Defaults to None.
+            progress_callback (Optional[Callable[[ExportProgress], None]], optional): 変換中に一定間隔で呼び出される進捗のコールバック. Defaults to None.
         """
-        # 量子化スレッドの入出力用
-        input_queue = mp.Queue()
-        output_queue = mp.Queue()
+        # 立ち上げ前に中止された場合
+        if self.cancelled.is_set():
+            if exported_callback is not None:
+                exported_callback(False, info.output_path)
+            return
+
+        # 出力結果のキャッシュ
+        cache = ExportCache(info.cache_dir, info.cache_max_bytes) if info.cache_dir != "" else None
+        if cache is not None:
+            # NOTE: 出力ファイルサイズの上限に合わせて設定を変更する前にキーを求めます。
+            # NOTE: 入力動画を読めずにキーを求められない場合は、キャッシュを使わずに続けます。
+            try:
+                cache_key = cache.get_key(info.input_path, info.get_cache_settings())
+            except OSError:
+                cache = None
+        if cache is not None:
+            if cache.load(cache_key, info.output_path):
+                # NOTE: 複製中に中止された場合は、複製した出力を削除して中止として扱います。
+                if self.cancelled.is_set():
+                    Path(info.output_path).unlink(missing_ok=True)
+                    if exported_callback is not None:
+                        exported_callback(False, info.output_path)
+                    return
+                if quantized_callback is not None:
+                    quantized_callback(*GIFConverter.load_images(info.output_path))
+                if exported_callback is not None:
+                    exported_callback(True, info.output_path)
+                return
 
-        # 量子化スレッドリスト
-        # NOTE: 元はプロセスだけどtkinterとの相性問題でスレッドに変更.
-        threads:list[th.Thread] = []
+        # 前回のGIF変換の中間結果を再利用できる場合は、変わった段階以降のみをやり直します。
+        try:
+            is_reused = self.export_stages(info, quantized_callback)
+        except GIFExportCancelled:
+            if exported_callback is not None:
+                exported_callback(False, info.output_path)
+            return
+        if is_reused:
+            if cache is not None:
+                try:
+                    cache.store(cache_key, info.output_path)
+                except OSError:
+                    pass
+            if exported_callback is not None:
+                exported_callback(True, info.output_path)
+            return
+        self.stages = None
+
+        # 出力ファイルサイズの上限に合わせて変更する前の設定
+        requested = replace(info)
+
+        # 量子化処理の出力先
+        output_queue = FrameReorderBuffer(info.num_workers * self.REORDER_WINDOW_PER_WORKER)
+
+        # NOTE: 出力先を登録する前に中止された場合も、最初から閉じておくことで直ちに打ち切られます。
+        self.output_queue = output_queue
+        if self.cancelled.is_set():
+            output_queue.close()
+
+        # ステージごとのワーカー数の自動調整
+        tuner = WorkerTuner(info.num_workers)
+
+        # ステージごとの処理時間の記録
+        # NOTE: プロセスで量子化する場合、子プロセスの処理時間は記録されません。
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.name_thread("writer")
+
+        # 量子化プロセスリスト
+        processes:list[mp.Process] = []
+
+        # 共有メモリのリングバッファ
+        ring:Optional[SharedFrameRing] = None
+
+        # 画像の入力キュー、デコード済みフレームのキャッシュの書き込み、動画読込スレッド、進捗の通知
+        # NOTE: 準備の途中で失敗した場合も、立ち上げた分だけ後始末できるよう先に宣言しておきます。
+        input_queue:Optional[Union[BoundedFrameQueue, SharedFrameRing]] = None
+        frame_cache_writer:Optional[FrameCacheWriter] = None
+        reader:Optional[th.Thread] = None
+        monitor:Optional[ProgressMonitor] = None
+        writer:Optional[GIFWriter] = None
+
+        # 出力範囲にフレームが無く、空の出力となったか
+        is_empty = False
 
         # 動画読込
+        # NOTE: 読み込めない動画などによる準備中の例外も失敗として、GIF出力後のコールバックへ渡します。
         with WithVideoCapture(info.input_path) as cap:
-            # プロセスの立ち上げ
-            for _ in range(info.num_workers):
+            try:
+                # 出力範囲
+                start_frame, end_frame = info.get_frame_range(cap.fps)
+
+                # 出力ファイルサイズの上限に収まるよう、リサイズ、色数、フレームレートを下げます。
+                if info.target_size > 0:
+                    GIFConverter.fit_target_size(info, cap, start_frame, end_frame, self.cancelled)
+
+                # リサイズ後の画像サイズ(リサイズしない場合は0)
                 if info.resize != 1.0:
-                    thread = th.Thread(
-                        target=GIFConverter.update_image_scale_quantize,
-                        args=(
-                            input_queue,
-                            output_queue,
-                            int(cap.width * info.resize),
-                            int(cap.height * info.resize),
-                            cv2.INTER_AREA,
-                            info.quantize_method,
-                            info.quantize_kmeans,
-                        ),
-                        daemon=True,
+                    width, height = int(cap.width * info.resize), int(cap.height * info.resize)
+                else:
+                    width, height = 0, 0
+
+                # 動画全体で共通のパレット
+                if info.global_palette:
+                    palette = GIFConverter.sample_global_palette(
+                        info.input_path,
+                        width,
+                        height,
+                        info.quantize_method,
+                        info.quantize_kmeans,
+                        start_frame,
+                        end_frame,
+                        info.quantize_colors,
+                        self.cancelled,
                     )
                 else:
-                    thread = th.Thread(
-                        target=GIFConverter.update_image_quantize,
+                    palette = None
+
+                # デコード済みフレームのキャッシュ
+                # NOTE: キャッシュに有る場合は動画をデコードせず、キャッシュのフレームを読み込みます。
+                source:Union[WithVideoCapture, CachedCapture] = cap
+                if info.frame_cache_dir != "":
+                    frame_cache = FrameCache(info.frame_cache_dir, info.frame_cache_max_bytes)
+                    frame_cache_key = frame_cache.get_key(info.input_path, width, height, start_frame, end_frame)
+                    if (cached_frames:=frame_cache.load(frame_cache_key)) is not None:
+                        source = CachedCapture(cached_frames, start_frame)
+                    else:
+                        num_frames = max(0, (end_frame if 0 <= end_frame <= cap.frames else cap.frames) - start_frame)
+                        frame_bytes = (width * height if width > 0 else cap.width * cap.height) * 3
+                        frame_cache_writer = frame_cache.create(frame_cache_key, num_frames * frame_bytes)
+
+                # NOTE: キャッシュを読み書きする場合は読込スレッドでリサイズ済みのため、ワーカーではリサイズしません。
+                if source is not cap or frame_cache_writer is not None:
+                    worker_width, worker_height = 0, 0
+                else:
+                    worker_width, worker_height = width, height
+
+                # ショットごとのパレット
+                # NOTE: 共通パレットを使用する場合はパレットを作り直す必要がありません。
+                if info.scene_threshold >= 0.0 and palette is None:
+                    scene_detector = SceneDetector(info.scene_threshold, info.quantize_method, info.quantize_kmeans, info.quantize_colors)
+                else:
+                    scene_detector = None
+
+                # フレームごとのミニバッチk-meansのパレット
+                # NOTE: 直前のフレームのパレットを初期値とするため、ワーカーごとではなく読込スレッドでフレーム順に作成し、
+                #       ワーカーはパレットへの割り当てのみを並列に行います。
+                if info.quantize_method == FrameQuantizer.MINIBATCH_KMEANS and palette is None and scene_detector is None:
+                    palette_fitter = FrameQuantizer(info.quantize_method, info.quantize_kmeans, colors=info.quantize_colors)
+                else:
+                    palette_fitter = None
+
+                if info.backend == self.BACKEND_PROCESS:
+                    # NOTE: 画像は共有メモリのリングバッファで受け渡すため、処理待ちの画像はスロット数で制限されます。
+                    slot_bytes = cap.width * cap.height * 3
+                    slots = info.max_inflight_frames
+                    if info.max_inflight_bytes > 0:
+                        slots = min(slots, max(1, info.max_inflight_bytes // max(1, slot_bytes)))
+
+                    context = mp.get_context("spawn")
+                    ring = input_queue = SharedFrameRing(context, slots, slot_bytes)
+                    result_queue = context.Queue()
+
+                    # NOTE: 有効なワーカー数は共有メモリで共有し、自動調整で有効になったプロセスのみが仕事を受け取ります。
+                    limit = context.RawValue("i", 0)
+                    tuner.share(WorkerTuner.STAGE_QUANTIZE, limit)
+
+                    # プロセスの立ち上げ
+                    for worker in range(info.num_workers):
+                        process = context.Process(
+                            target=GIFConverter.update_process_quantize,
+                            args=(
+                                ring,
+                                result_queue,
+                                worker_width,
+                                worker_height,
+                                cv2.INTER_AREA,
+                                FrameQuantizer(info.quantize_method, info.quantize_kmeans, palette, info.quantize_dither, info.quantize_colors, palette_fitter is not None),
+                                limit,
+                                worker,
+                            ),
+                            daemon=True,
+                        )
+                        process.start()
+                        processes.append(process)
+
+                    # 量子化結果の受信スレッドの立ち上げ
+                    th.Thread(
+                        target=GIFConverter.update_process_result,
                         args=(
-                            input_queue,
+                            result_queue,
                             output_queue,
-                            info.quantize_method,
-                            info.quantize_kmeans,
+                            info.num_workers,
+                            tuner,
                         ),
                         daemon=True,
+                    ).start()
+                else:
+                    # NOTE: 読込が量子化を追い越して画像が溜まり続けないよう、処理待ちの画像を制限します。
+                    # NOTE: 量子化はスレッドで行うため、mp.Queueのようなシリアライズを伴わない参照渡しのキューを使用します。
+                    input_queue = BoundedFrameQueue(queue.SimpleQueue(), info.max_inflight_frames, info.max_inflight_bytes)
+
+                    # スレッドの立ち上げ
+                    # NOTE: 元はプロセスだけどtkinterとの相性問題でスレッドに変更.
+                    # NOTE: コア数分を立ち上げ、自動調整で有効になったワーカーのみが仕事を受け取ります。
+                    for worker in range(info.num_workers):
+                        if worker_width > 0:
+                            thread = th.Thread(
+                                target=GIFConverter.update_image_scale_quantize,
+                                args=(
+                                    input_queue,
+                                    output_queue,
+                                    worker_width,
+                                    worker_height,
+                                    cv2.INTER_AREA,
+                                    FrameQuantizer(info.quantize_method, info.quantize_kmeans, palette, info.quantize_dither, info.quantize_colors, palette_fitter is not None),
+                                    tuner,
+                                    worker,
+                                    tracer,
+                                ),
+                                daemon=True,
+                            )
+                        else:
+                            thread = th.Thread(
+                                target=GIFConverter.update_image_quantize,
+                                args=(
+                                    input_queue,
+                                    output_queue,
+                                    FrameQuantizer(info.quantize_method, info.quantize_kmeans, palette, info.quantize_dither, info.quantize_colors, palette_fitter is not None),
+                                    tuner,
+                                    worker,
+                                    tracer,
+                                ),
+                                daemon=True,
+                            )
+                        thread.start()
+
+                # 出力フレームごとの元動画のフレーム数
+                repeats:list[int] = []
+
+                # 元動画の1フレームあたりの出力フレーム数(1以上の場合は間引きません)
+                # NOTE: 再生速度を上げると元動画の1秒が短くなるため、その分多く間引きます。
+                if info.target_fps > 0.0 and cap.fps > 0.0:
+                    frame_rate = info.target_fps / (cap.fps * info.play_speed)
+                else:
+                    frame_rate = 1.0
+
+                # 動画読込スレッドの立ち上げ
+                reader = th.Thread(
+                    target=GIFConverter.update_video_read,
+                    args=(
+                        source,
+                        input_queue,
+                        output_queue,
+                        info.num_workers,
+                        repeats,
+                        info.dedupe_threshold,
+                        frame_rate,
+                        start_frame,
+                        end_frame,
+                        scene_detector,
+                        width,
+                        height,
+                        frame_cache_writer,
+                        tracer,
+                        palette_fitter,
+                    ),
+                    daemon=True,
+                )
+                reader.start()
+
+                # 進捗の定期的な通知
+                # NOTE: 書き込みループではフレーム数を加算するのみで、集計とコールバックは監視スレッドで行います。
+                if progress_callback is not None:
+                    monitor = ProgressMonitor(
+                        progress_callback,
+                        (end_frame if 0 <= end_frame <= cap.frames else cap.frames) - start_frame,
+                        lambda: source.frame + 1 - start_frame,
+                        lambda: output_queue.received,
                     )
-                thread.start()
-                threads.append(thread)
+                    monitor.start()
+
+                # 画像1枚あたりの表示時間
+                duration = 1.0 / (cap.fps * info.play_speed) * 1000.0
+
+                # 量子化完了後のコールバック用に画像を保持します。
+                images:list[Image.Image] = []
+
+                # 再出力用に量子化結果を保持します。
+                frames:Optional[list[tuple[np.ndarray, np.ndarray]]] = [] if self.retain_frames else None
+                frames_bytes = 0
+
+                # フレーム順に揃った画像から逐次GIF出力
+                # NOTE: 出力先を開く前に中止された場合は、出力先の既存のファイルを残します。
+                if self.cancelled.is_set():
+                    raise GIFExportCancelled()
+                writer = GIFWriter(info.output_path, palette=palette, delta=info.delta_encoding, num_workers=info.num_workers, tuner=tuner, tracer=tracer)
+                with writer:
+                    # NOTE: 重複フレームによる表示時間の延長は、次のフレームが読み込まれるまで確定しないため、
+                    #       次のフレームの量子化結果が届いてから書き込みます。
+                    # NOTE: 量子化結果はインデックス画像とパレットのまま書き込むため、再量子化は行われません。
+                    start = time.perf_counter()
+                    frame, values = 0, output_queue.get()
+                    if tracer is not None:
+                        tracer.add(PipelineTracer.STAGE_WAIT_GET, frame, start)
+                    while values is not None:
+                        start = time.perf_counter()
+                        next_values = output_queue.get()
+                        written = time.perf_counter()
+                        writer.write(*values, duration * repeats[frame])
+                        if tracer is not None:
+                            tracer.add(PipelineTracer.STAGE_WAIT_GET, frame + 1, start, written)
+                            tracer.add(PipelineTracer.STAGE_WRITE, frame, written)
+                        # NOTE: プロセスで量子化する場合は処理待ちを取得できないため、処理時間のみで配分します。
+                        tuner.update({
+                            WorkerTuner.STAGE_QUANTIZE: input_queue.frames / max(1, info.max_inflight_frames) if ring is None else 0.0,
+                            WorkerTuner.STAGE_ENCODE: writer.pending,
+                        })
+                        if quantized_callback is not None:
+                            images.extend([GIFConverter.index_to_image(*values)] * repeats[frame])
+                        if frames is not None:
+                            frames.append(values)
+                            frames_bytes += values[0].nbytes + values[1].nbytes
+                            if frames_bytes > self.STAGE_FRAMES_MAX_BYTES:
+                                frames = None
+                        if monitor is not None:
+                            monitor.written += 1
+                            monitor.completed += repeats[frame]
+                        frame, values = frame + 1, next_values
+
+                    # NOTE: 中止された場合や読込に失敗した場合は出力先が閉じられて終端と同じくNoneが届くため、
+                    #       例外で書き込みを打ち切ります。
+                    if output_queue.closed:
+                        if self.cancelled.is_set():
+                            raise GIFExportCancelled()
+                        raise RuntimeError("failed to read video")
+
+                    # NOTE: 出力範囲にフレームが無い場合はGIFとして不完全なため、失敗として削除します。
+                    if frame == 0:
+                        is_empty = True
+                        raise ValueError("no frames in export range")
+
+                    # 圧縮待ちのフレームとトレーラーの書き込みを記録します。
+                    start = time.perf_counter()
+                if tracer is not None:
+                    tracer.add(PipelineTracer.STAGE_SAVE, -1, start)
+
+                # 量子化完了後のコールバックが登録されている場合は、画像と表示時間を渡します。
+                if quantized_callback is not None:
+                    quantized_callback(images, duration)
+
+                # 出力結果
+                is_success, is_cancelled = True, False
+            except GIFExportCancelled:
+                is_success, is_cancelled = False, True
+            except Exception:
+                is_success, is_cancelled = False, False
+            finally:
+                # NOTE: 無効のまま待機しているワーカーにも終了合図を受け取らせます。
+                tuner.close()
+                if monitor is not None:
+                    monitor.stop(is_success)
+
+            # NOTE: 失敗、又は中止した場合は出力先を閉じて処理待ちのフレームを破棄します。
+            #       読込とワーカーは閉じた出力先を見て残りのフレームを処理せずに終了します。
+            if not is_success:
+                output_queue.close()
+                if ring is not None:
+                    ring.clear()
+            if reader is not None:
+                reader.join()
+            elif input_queue is not None:
+                # NOTE: 読込スレッドを立ち上げる前に失敗した場合は、代わりに量子化ワーカーの終了合図を送信します。
+                for _ in range(info.num_workers):
+                    input_queue.put(None)
+            self.output_queue = None
+
+            if not is_success and frame_cache_writer is not None:
+                frame_cache_writer.discard()
+
+        # 量子化プロセスの後始末
+        # NOTE: 結果キューへの書き込み中に強制終了するとキューのロックが解放されず受信が止まるため、
+        #       失敗した場合も終了合図による終了を待ち、応答しないプロセスのみを強制終了します。
+        for process in processes:
+            process.join(None if is_success else self.PROCESS_JOIN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+                # NOTE: 強制終了したプロセスは終了合図を送らないため、代わりに送って受信スレッドを終了させます。
+                result_queue.put(None)
+        if ring is not None:
+            ring.close()
+
+        # 中止した場合は書きかけの出力を、フレームが無い場合は空の出力を削除します。
+        # NOTE: 書き込みを始める前に中止した場合は、出力先の既存のファイルを残します。
+        if (is_cancelled or is_empty) and writer is not None:
+            Path(info.output_path).unlink(missing_ok=True)
+
+        # 出力結果をキャッシュへ保存
+        # NOTE: キャッシュへの保存に失敗しても出力自体は成功しているため、無視します。
+        if cache is not None and is_success:
+            try:
+                cache.store(cache_key, info.output_path)
+            except OSError:
+                pass
+
+        # 次回の出力で再利用する中間結果を保持します。
+        if is_success:
+            self.stages = GIFExportStages(
+                requested,
+                GIFConverter.get_file_stat(info.input_path),
+                GIFConverter.get_file_stat(info.output_path),
+                cap.fps,
+                repeats,
+                palette,
+                frames,
+            )
 
-            # 画像をキューに突っ込む
-            while cap.read():
-                input_queue.put((cap.frame, cv2.cvtColor(cap.image, cv2.COLOR_BGRA2RGB)))
+        # GIF出力後のコールバックが登録されている場合は、成否を渡します。
+        if exported_callback is not None:
+            exported_callback(is_success, info.output_path)
+
+    def export_stages(
+        self,
+        info:GIFExportInfo,
+        quantized_callback:Optional[Callable[[list[Image.Image], float], None]] = None,
+    ) -> bool:
+        """[Thread-N] 前回のGIF変換の中間結果を再利用したGIF出力
+
+        量子化までに影響する設定が前回と同じ場合は、前回の量子化結果から書き込みのみをやり直します。
+        更に表示時間のみが変わった場合は、前回出力したGIFのグラフィック制御拡張の遅延時間のみを書き換えます。
+        NOTE: 既定で再利用するのは出力したGIF(圧縮結果)のみです。量子化結果はretain_framesを有効にした場合のみ保持し、
+              デコード、リサイズ済みのフレームはframe_cache_dirを指定した場合のみthread_exportがキャッシュから読み込みます。
+        NOTE: フレームレートや出力ファイルサイズの上限を指定した場合は、再生速度によって間引くフレームが変わるため再利用しません。
+              また出力ファイルサイズの上限を指定した場合は、差分圧縮の有無によってリサイズや色数の選択が変わるため再利用しません。
+
+        Args:
+            info (GIFExportInfo): GIF変換、出力情報
+            quantized_callback (Optional[Callable[[list[Image.Image], float], None]], optional): 量子化後のコールバック. Defaults to None.
+
+        Returns:
+            bool: 中間結果を再利用して出力できた場合はTrueを返します。
+
+        Raises:
+            GIFExportCancelled: 出力中に中止された場合
+        """
+        if (stages:=self.stages) is None:
+            return False
 
-        # 量子化スレッドの終了合図を送信
-        for _ in range(info.num_workers):
-            input_queue.put(None)
+        # 入力動画が前回と同じか
+        if info.input_path != stages.info.input_path or GIFConverter.get_file_stat(info.input_path) != stages.input_stat:
+            return False
+
+        # 前回から変わった設定
+        settings, previous = info.get_cache_settings(), stages.info.get_cache_settings()
+        changed = {name for name, value in settings.items() if value != previous[name]}
+        if not changed <= self.STAGE_WRITE_SETTINGS:
+            return False
+        if "play_speed" in changed and (info.target_fps > 0.0 or info.target_size > 0):
+            return False
+        if "delta_encoding" in changed and info.target_size > 0:
+            return False
+
+        # 出力フレームごとの表示時間
+        duration = 1.0 / (stages.fps * info.play_speed) * 1000.0
+        durations = [duration * repeat for repeat in stages.repeats]
 
         try:
-            # 画像をフレーム順に並び替え
-            images:list[tuple[int, Image.Image]] = [output_queue.get() for _ in range(cap.frames)]
-            images:list[Image.Image] = [image for _, image in sorted(images, key=lambda values: values[0])]
+            if changed <= self.STAGE_TIMING_SETTINGS and GIFConverter.get_file_stat(stages.info.output_path) == stages.output_stat:
+                # 圧縮済みのGIFの遅延時間のみを書き換えます。
+                data = GIFWriter.retime(Path(stages.info.output_path).read_bytes(), durations)
+                if self.cancelled.is_set():
+                    raise GIFExportCancelled()
+                Path(info.output_path).write_bytes(data)
+                if quantized_callback is not None:
+                    quantized_callback(*GIFConverter.load_images(info.output_path))
+            elif stages.frames is not None:
+                # 量子化結果から書き込みのみをやり直します。
+                # NOTE: 中止された場合は書きかけの出力を削除します。
+                try:
+                    with GIFWriter(info.output_path, palette=stages.palette, delta=info.delta_encoding, num_workers=info.num_workers) as writer:
+                        for values, value in zip(stages.frames, durations):
+                            if self.cancelled.is_set():
+                                raise GIFExportCancelled()
+                            writer.write(*values, value)
+                except GIFExportCancelled:
+                    Path(info.output_path).unlink(missing_ok=True)
+                    raise
+                if quantized_callback is not None:
+                    images = [image for values, repeat in zip(stages.frames, stages.repeats) for image in [GIFConverter.index_to_image(*values)] * repeat]
+                    quantized_callback(images, duration)
+            else:
+                return False
+        except (OSError, ValueError):
+            return False
 
-            # 画像1枚あたりの表示時間
-            duration = 1.0 / (cap.fps * info.play_speed) * 1000.0
+        self.stages = replace(stages, info=replace(info), output_stat=GIFConverter.get_file_stat(info.output_path))
+        return True
 
-            # 量子化完了後のコールバックが登録されている場合は、画像と表示時間を渡します。
-            if quantized_callback is not None:
-                quantized_callback(images, duration)
+    @staticmethod
+    def get_file_stat(path:Union[Path, str]) -> tuple[int, int]:
+        """ファイルの変更判定に使用するサイズと更新日時を取得
+
+        Args:
+            path (Union[Path, str]): ファイルパス
 
-            # GIF出力
-            images[0].save(info.output_path, save_all=True, append_images=images[1:], optimize=False, duration=duration, loop=0)
+        Returns:
+            tuple[int, int]: サイズと更新日時(ナノ秒)、又はファイルが無い場合は(-1, -1)を返します。
+        """
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return -1, -1
+        return stat.st_size, stat.st_mtime_ns
 
-            # 出力結果
-            is_success = True
+    @staticmethod
+    def sample_global_palette(
+        input_path:str,
+        width:int,
+        height:int,
+        quantize_method:int,
+        quantize_kmeans:int,
+        start_frame:int = 0,
+        end_frame:int = -1,
+        colors:int = 256,
+        cancelled:Optional[th.Event] = None,
+    ) -> Optional[np.ndarray]:
+        """動画全体で共通のパレットを作成
+
+        出力範囲から等間隔に抜き出したフレームの画素を間引いて集め、1つのパレットを作成します。
+
+        Args:
+            input_path (str): 動画の入力パス
+            width (int): リサイズ後の横幅(0の場合はリサイズしません)
+            height (int): リサイズ後の縦幅(0の場合はリサイズしません)
+            quantize_method (int): 量子化の種類
+            quantize_kmeans (int): クラスタ数
+            start_frame (int, optional): 出力範囲の開始フレーム. Defaults to 0.
+            end_frame (int, optional): 出力範囲の終了フレーム(含まず、-1の場合は最後まで). Defaults to -1.
+            colors (int, optional): パレットの色数. Defaults to 256.
+            cancelled (Optional[th.Event], optional): 中止要求(セットされた場合はGIFExportCancelledを送出します). Defaults to None.
+
+        Returns:
+            Optional[np.ndarray]: パレット(N, 3)、又は作成できなかった場合はNoneを返します。
+        """
+        rng = np.random.default_rng(0)
+        samples:list[np.ndarray] = []
+
+        with WithVideoCapture(input_path) as cap:
+            if end_frame < 0 or end_frame > cap.frames:
+                end_frame = cap.frames
+
+            num_frames = max(1, min(end_frame - start_frame, GIFConverter.GLOBAL_PALETTE_SAMPLE_FRAMES))
+            num_pixels = max(1, GIFConverter.GLOBAL_PALETTE_SAMPLE_PIXELS // num_frames)
+
+            for frame in np.unique(np.linspace(start_frame, max(start_frame, end_frame - 1), num_frames).astype(int)):
+                if cancelled is not None and cancelled.is_set():
+                    raise GIFExportCancelled()
+
+                if not cap.advance_to(int(frame)) or not cap.read():
+                    break
+
+                image = cv2.cvtColor(cap.image, cv2.COLOR_BGRA2RGB)
+                if width > 0:
+                    image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+                pixels = image.reshape(-1, 3)
+                samples.append(pixels[rng.choice(len(pixels), min(len(pixels), num_pixels), replace=False)])
+
+        if len(samples) == 0:
+            return None
+
+        return FrameQuantizer.build_palette(np.concatenate(samples), quantize_method, quantize_kmeans, colors)
+
+    @staticmethod
+    def sample_segments(
+        input_path:str,
+        start_frame:int,
+        end_frame:int,
+        segments:int,
+        segment_frames:int,
+        cancelled:Optional[th.Event] = None,
+    ) -> tuple[list[list[np.ndarray]], int]:
+        """出力範囲から等間隔に連続したフレームを抜き出す
+
+        Args:
+            input_path (str): 動画の入力パス
+            start_frame (int): 出力範囲の開始フレーム
+            end_frame (int): 出力範囲の終了フレーム(含まず、-1の場合は最後まで)
+            segments (int): 区間数
+            segment_frames (int): 1区間あたりのフレーム数
+            cancelled (Optional[th.Event], optional): 中止要求(セットされた場合はGIFExportCancelledを送出します). Defaults to None.
+
+        Returns:
+            tuple[list[list[np.ndarray]], int]: 区間ごとの画像と、出力範囲のフレーム数
+        """
+        results:list[list[np.ndarray]] = []
+
+        with WithVideoCapture(input_path) as cap:
+            if end_frame < 0 or end_frame > cap.frames:
+                end_frame = cap.frames
+            total_frames = max(0, end_frame - start_frame)
+
+            starts = np.linspace(start_frame, max(start_frame, end_frame - segment_frames), max(1, segments)).astype(int)
+            for frame in np.unique(starts):
+                if cancelled is not None and cancelled.is_set():
+                    raise GIFExportCancelled()
+
+                if not cap.advance_to(int(frame)):
+                    break
+
+                images:list[np.ndarray] = []
+                while len(images) < segment_frames and cap.frame + 1 < end_frame and cap.read():
+                    images.append(cv2.cvtColor(cap.image, cv2.COLOR_BGRA2RGB))
+                if len(images) > 0:
+                    results.append(images)
+
+        return results, total_frames
+
+    @staticmethod
+    def quantize_segments(
+        segments:list[list[np.ndarray]],
+        info:GIFExportInfo,
+        width:int,
+        height:int,
+        colors:int,
+    ) -> tuple[Optional[np.ndarray], list[list[tuple[np.ndarray, np.ndarray]]]]:
+        """抜き出したフレームの量子化
+
+        出力時と同じく共通パレットやショットごとのパレットを使用して量子化します。
+
+        Args:
+            segments (list[list[np.ndarray]]): 区間ごとの画像
+            info (GIFExportInfo): GIF変換、出力情報
+            width (int): リサイズ後の横幅(0の場合はリサイズしません)
+            height (int): リサイズ後の縦幅(0の場合はリサイズしません)
+            colors (int): 減色後の色数
+
+        Returns:
+            tuple[Optional[np.ndarray], list[list[tuple[np.ndarray, np.ndarray]]]]: 共通パレットと、区間ごとの量子化結果
+        """
+        if width > 0:
+            segments = [[cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA) for image in images] for images in segments]
+
+        # 動画全体で共通のパレット
+        palette = None
+        if info.global_palette:
+            rng = np.random.default_rng(0)
+            pixels = np.concatenate([image.reshape(-1, 3) for images in segments for image in images])
+            pixels = pixels[rng.choice(len(pixels), min(len(pixels), GIFConverter.GLOBAL_PALETTE_SAMPLE_PIXELS), replace=False)]
+            palette = FrameQuantizer.build_palette(pixels, info.quantize_method, info.quantize_kmeans, colors)
+
+        results:list[list[tuple[np.ndarray, np.ndarray]]] = []
+        for images in segments:
+            quantizer = FrameQuantizer(info.quantize_method, info.quantize_kmeans, palette, info.quantize_dither, colors)
+            if info.scene_threshold >= 0.0 and palette is None:
+                scene_detector = SceneDetector(info.scene_threshold, info.quantize_method, info.quantize_kmeans, colors)
+            else:
+                scene_detector = None
+            results.append([
+                quantizer.quantize(image, scene_detector.get_palette(image) if scene_detector is not None else None)
+                for image in images
+            ])
+
+        return palette, results
+
+    @staticmethod
+    def estimate_size(
+        palette:Optional[np.ndarray],
+        segments:list[list[tuple[np.ndarray, np.ndarray]]],
+        delta:bool,
+        frame_rate:float,
+        total_frames:int,
+    ) -> float:
+        """量子化結果の書き込みサイズから出力サイズを予測
+
+        区間ごとに書き込み、ヘッダーと先頭フレームのサイズに、
+        以降のフレームの元動画1フレームあたりのサイズを出力範囲のフレーム数分加算します。
+
+        Args:
+            palette (Optional[np.ndarray]): 共通パレット
+            segments (list[list[tuple[np.ndarray, np.ndarray]]]): 区間ごとの量子化結果
+            delta (bool): 前フレームからの変化領域のみを書き込むか
+            frame_rate (float): 元動画の1フレームあたりの出力フレーム数(1以上の場合は間引きません)
+            total_frames (int): 出力範囲のフレーム数
+
+        Returns:
+            float: 予測した出力サイズ(バイト)
+        """
+        first_bytes, frame_bytes, frames = 0, 0, 0
+        for values in segments:
+            with GIFWriter(fp:=io.BytesIO(), palette=palette, delta=delta) as writer:
+                for frame, (index, frame_palette) in enumerate(values):
+                    # NOTE: 読込時と同じく出力フレームの区切りを跨がないフレームは間引きます。
+                    if frame > 0 and frame_rate < 1.0 and math.floor(frame * frame_rate) == math.floor((frame - 1) * frame_rate):
+                        continue
+                    writer.write(index, frame_palette, 0.0)
+                    if frame == 0:
+                        first_bytes += fp.tell()
+                        start = fp.tell()
+            frame_bytes += fp.tell() - start
+            frames += len(values) - 1
+
+        if len(segments) == 0:
+            return 0.0
+
+        return first_bytes / len(segments) + frame_bytes / max(1, frames) * max(0, total_frames - 1)
+
+    @staticmethod
+    def fit_target_size(
+        info:GIFExportInfo,
+        cap:WithVideoCapture,
+        start_frame:int,
+        end_frame:int,
+        cancelled:Optional[th.Event] = None,
+    ) -> None:
+        """出力サイズの上限に収まる設定を探索
+
+        1回の読込で抜き出したフレームを全ての候補で使い回し、候補ごとに量子化と書き込みを行って出力サイズを予測します。
+        色数とフレームレートごとに上限に収まる最大のリサイズを探し、予測した出力サイズが上限に最も近い組み合わせをinfoへ反映します。
+        いずれの組み合わせも上限に収まらない場合は、予測した出力サイズが最小の組み合わせを反映します。
+
+        Args:
+            info (GIFExportInfo): GIF変換、出力情報
+            cap (WithVideoCapture): 動画
+            start_frame (int): 出力範囲の開始フレーム
+            end_frame (int): 出力範囲の終了フレーム(含まず、-1の場合は最後まで)
+            cancelled (Optional[th.Event], optional): 中止要求(セットされた場合は候補の間でGIFExportCancelledを送出します). Defaults to None.
+        """
+        segments, total_frames = GIFConverter.sample_segments(
+            info.input_path,
+            start_frame,
+            end_frame,
+            GIFConverter.TARGET_SIZE_SEGMENTS,
+            GIFConverter.TARGET_SIZE_SEGMENT_FRAMES,
+            cancelled,
+        )
+        if len(segments) == 0 or cap.fps <= 0.0:
+            return
+
+        # 候補(出力するGIFのフレームレートは指定値又は元動画のフレームレートより低いもののみ)
+        resizes = [info.resize * resize for resize in GIFConverter.TARGET_SIZE_RESIZES]
+        colors_list = [colors for colors in GIFConverter.TARGET_SIZE_COLORS if colors <= info.quantize_colors] or [info.quantize_colors]
+        max_fps = info.target_fps if info.target_fps > 0.0 else cap.fps * info.play_speed
+        fps_list = [info.target_fps] + [fps for fps in GIFConverter.TARGET_SIZE_FPS if fps < max_fps]
+
+        budget = info.target_size * GIFConverter.TARGET_SIZE_MARGIN
+        sizes:dict[tuple[int, int], list[float]] = {}
+
+        def get_sizes(resize_index:int, colors:int) -> list[float]:
+            """フレームレートの候補ごとの予測サイズを取得"""
+            if (key:=(resize_index, colors)) not in sizes:
+                if cancelled is not None and cancelled.is_set():
+                    raise GIFExportCancelled()
+                resize = resizes[resize_index]
+                width, height = (int(cap.width * resize), int(cap.height * resize)) if resize != 1.0 else (0, 0)
+                palette, quantized = GIFConverter.quantize_segments(segments, info, width, height, colors)
+                sizes[key] = [
+                    GIFConverter.estimate_size(
+                        palette,
+                        quantized,
+                        info.delta_encoding,
+                        fps / (cap.fps * info.play_speed) if fps > 0.0 else 1.0,
+                        total_frames,
+                    )
+                    for fps in fps_list
+                ]
+            return sizes[key]
+
+        for colors in colors_list:
+            # NOTE: 出力サイズは画素数にほぼ比例するため、最も小さいリサイズでの予測サイズから
+            #       フレームレートごとに上限に収まるリサイズを見積もり、収まるまで1段階ずつ下げて確認します。
+            last = len(resizes) - 1
+            for fps_index, size in enumerate(get_sizes(last, colors)):
+                resize = resizes[last] * math.sqrt(budget / max(1.0, size))
+                resize_index = next((index for index, value in enumerate(resizes) if value <= resize), last)
+                while resize_index < last and get_sizes(resize_index, colors)[fps_index] > budget:
+                    resize_index += 1
+
+        # 上限に収まる最大の予測サイズの組み合わせ、又は最小の予測サイズの組み合わせ
+        candidates = [
+            (size, resize_index, colors, fps)
+            for (resize_index, colors), values in sizes.items()
+            for size, fps in zip(values, fps_list)
+        ]
+        fits = [candidate for candidate in candidates if candidate[0] <= budget]
+        if len(fits) > 0:
+            _, resize_index, colors, fps = max(fits, key=lambda candidate: candidate[0])
+        else:
+            _, resize_index, colors, fps = min(candidates, key=lambda candidate: candidate[0])
+
+        info.resize = resizes[resize_index]
+        info.quantize_colors = colors
+        info.target_fps = fps
+
+    @staticmethod
+    def update_video_read(
+        cap:Union[WithVideoCapture, CachedCapture],
+        input_queue:Union[BoundedFrameQueue, SharedFrameRing],
+        output_queue:FrameReorderBuffer,
+        num_workers:int,
+        repeats:list[int],
+        dedupe_threshold:int,
+        frame_rate:float,
+        start_frame:int,
+        end_frame:int,
+        scene_detector:Optional[SceneDetector],
+        width:int = 0,
+        height:int = 0,
+        cache_writer:Optional[FrameCacheWriter] = None,
+        tracer:Optional[PipelineTracer] = None,
+        palette_fitter:Optional[FrameQuantizer] = None,
+    ) -> None:
+        """動画の読込
+
+        読み込んだ画像は入力キューに積まれ、読込終了後に量子化スレッドの終了合図と
+        出力の終端を送信します。
+        フレームレートに合わせて間引くフレームと、直前に送信した画像と重複する画像は送信せず、
+        直前の画像の表示フレーム数に加算します。間引くフレームは画像を取り出さずに読み飛ばします。
+        出力範囲の開始フレームへはシークで移動し、終了フレームに達した時点で読込を終了します。
+        シーン切り替えを検出する場合は、フレーム番号と画像にショットのパレットを添えて送信します。
+        ミニバッチk-meansの場合も同じく、直前のフレームのパレットから更新したパレットを添えて送信します。
+        NOTE: ショットの切り替えはフレーム順に判定する必要があるため読込スレッドで行い、
+              ワーカーはパレットへの割り当てのみを並列に行います。
+        デコード済みフレームのキャッシュを書き込む場合は、出力範囲の全フレームをRGB変換、リサイズして書き込み、
+        読込を終えた時点でキャッシュを完成させます。キャッシュから読み込む場合は変換済みの画像をそのまま送信します。
+        出力先が閉じられた場合は読込を打ち切り、キャッシュを完成させずに終了合図のみを送信します。
+        読込に失敗した場合は出力先を閉じて、終了合図を送信します。
+
+        Args:
+            cap (Union[WithVideoCapture, CachedCapture]): 動画、又はデコード済みフレームのキャッシュ
+            input_queue (Union[BoundedFrameQueue, SharedFrameRing]): 画像の入力キュー
+            output_queue (FrameReorderBuffer): 画像の出力先
+            num_workers (int): 量子化処理のワーカー数
+            repeats (list[int]): 出力フレームごとの元動画のフレーム数の格納先
+            dedupe_threshold (int): 重複とみなす画素値の最大差(0で完全一致のみ、負数で無効)
+            frame_rate (float): 元動画の1フレームあたりの出力フレーム数(1以上の場合は間引きません)
+            start_frame (int): 出力範囲の開始フレーム
+            end_frame (int): 出力範囲の終了フレーム(含まず、-1の場合は最後まで)
+            scene_detector (Optional[SceneDetector]): シーン切り替えの検出(Noneの場合はフレームごとに量子化します)
+            width (int, optional): キャッシュへ書き込む画像のリサイズ後の横幅(0の場合はリサイズしません). Defaults to 0.
+            height (int, optional): キャッシュへ書き込む画像のリサイズ後の縦幅(0の場合はリサイズしません). Defaults to 0.
+            cache_writer (Optional[FrameCacheWriter], optional): デコード済みフレームのキャッシュの書き込み. Defaults to None.
+            tracer (Optional[PipelineTracer], optional): ステージごとの処理時間の記録. Defaults to None.
+            palette_fitter (Optional[FrameQuantizer], optional): フレーム順にパレットを作成するミニバッチk-means(Noneの場合はワーカーで量子化します). Defaults to None.
+        """
+        if tracer is not None:
+            tracer.name_thread("reader")
+
+        # 直前に送信した画像
+        previous:Optional[np.ndarray] = None
+
+        try:
+            # 開始フレームへ移動
+            # NOTE: シークできない場合は読み飛ばします。
+            if start_frame > 0 and not cap.seek(start_frame):
+                while cap.frame + 1 < start_frame and cap.grab():
+                    pass
+            start_frame = cap.frame + 1
+
+            # 画像をキューに突っ込む
+            while True:
+                # 出力先が閉じられた場合は中止、又は失敗のため読込を打ち切ります。
+                if output_queue.closed:
+                    break
+
+                # 終了フレームに達したら読込を終了します。
+                frame = cap.frame + 1
+                if 0 <= end_frame <= frame:
+                    break
+
+                # 出力フレームの区切りを跨がないフレームは間引きます。
+                # NOTE: キャッシュを書き込む場合は、他のフレームレートでも使えるよう間引くフレームも読み込みます。
+                frame -= start_frame
+                is_dropped = frame_rate < 1.0 and math.floor(frame * frame_rate) == math.floor((frame - 1) * frame_rate)
+                start = time.perf_counter()
+                if is_dropped and cache_writer is None:
+                    if not cap.grab():
+                        break
+                    if tracer is not None:
+                        tracer.add(PipelineTracer.STAGE_DECODE, cap.frame, start)
+                    repeats[-1] += 1
+                    continue
+
+                if not cap.read():
+                    break
+                if tracer is not None:
+                    tracer.add(PipelineTracer.STAGE_DECODE, cap.frame, start)
+                if isinstance(cap, CachedCapture):
+                    image = cap.image
+                else:
+                    start = time.perf_counter()
+                    image = cv2.cvtColor(cap.image, cv2.COLOR_BGRA2RGB)
+                    if tracer is not None:
+                        tracer.add(PipelineTracer.STAGE_CONVERT, cap.frame, start)
+                    if cache_writer is not None:
+                        if width > 0:
+                            start = time.perf_counter()
+                            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+                            if tracer is not None:
+                                tracer.add(PipelineTracer.STAGE_RESIZE, cap.frame, start)
+                        # NOTE: キャッシュへの書き込みに失敗しても出力には影響しないため、破棄して続けます。
+                        try:
+                            cache_writer.append(image)
+                        except OSError:
+                            cache_writer.discard()
+
+                if is_dropped:
+                    repeats[-1] += 1
+                    continue
+
+                # 重複する画像は量子化せずに直前の画像の表示時間を延ばします。
+                if GIFConverter.is_duplicate_image(image, previous, dedupe_threshold):
+                    repeats[-1] += 1
+                    continue
+
+                # NOTE: 表示フレーム数を確定させてから送信します。
+                repeats.append(1)
+                frame = len(repeats) - 1
+                if scene_detector is not None:
+                    start = time.perf_counter()
+                    palette = scene_detector.get_palette(image)
+                    if tracer is not None:
+                        tracer.add(PipelineTracer.STAGE_SCENE, frame, start)
+                elif palette_fitter is not None:
+                    start = time.perf_counter()
+                    palette = palette_fitter.fit_kmeans(image)
+                    if tracer is not None:
+                        tracer.add(PipelineTracer.STAGE_QUANTIZE, frame, start)
+                else:
+                    palette = None
+
+                # NOTE: 量子化が追いついていない場合は処理待ちに空きができるまで待機します。
+                start = time.perf_counter()
+                input_queue.put((frame, image, palette))
+                if tracer is not None:
+                    tracer.add(PipelineTracer.STAGE_WAIT_PUT, frame, start)
+                previous = image
+
+            # デコード済みフレームのキャッシュを完成させます。
+            # NOTE: キャッシュへの保存に失敗しても出力には影響しないため、破棄して続けます。
+            # NOTE: 読込を打ち切った場合は未完成のため、呼び出し側で破棄します。
+            if cache_writer is not None and not output_queue.closed:
+                try:
+                    cache_writer.commit()
+                except OSError:
+                    cache_writer.discard()
         except Exception:
-            is_success = False
+            # NOTE: 読込に失敗した場合は出力先を閉じて、書き込み側とワーカーに打ち切らせます。
+            output_queue.close()
+        finally:
+            # 量子化スレッドの終了合図を送信
+            for _ in range(num_workers):
+                input_queue.put(None)
 
-        # GIF出力後のコールバックが登録されている場合は、成否を渡します。
-        if exported_callback is not None:
-            exported_callback(is_success, info.output_path)
+            # 出力の終端を送信
+            output_queue.put((len(repeats), None))
+
+    @staticmethod
+    def is_duplicate_image(image:np.ndarray, previous:Optional[np.ndarray], threshold:int) -> bool:
+        """画像の重複判定
+
+        Args:
+            image (np.ndarray): 判定する画像
+            previous (Optional[np.ndarray]): 比較対象の画像
+            threshold (int): 重複とみなす画素値の最大差(0で完全一致のみ、負数で無効)
+
+        Returns:
+            bool: 全ての画素値の差がthreshold以下の場合はTrueを返します。
+        """
+        if previous is None or threshold < 0 or image.shape != previous.shape:
+            return False
+
+        if threshold == 0:
+            return np.array_equal(image, previous)
+
+        return int(cv2.absdiff(image, previous).max()) <= threshold
+
+    @staticmethod
+    def update_process_quantize(
+        ring:SharedFrameRing,
+        result_queue:mp.Queue,
+        width:int,
+        height:int,
+        interpolation:int,
+        quantizer:FrameQuantizer,
+        limit:Any = None,
+        worker:int = 0,
+    ) -> None:
+        """[Process-N] 共有メモリ上の画像のリサイズと量子化
+
+        量子化結果はインデックス画像とパレットとして、処理時間と共に結果キューに積まれます。
+        失敗した場合は、結果の代わりにFalseを積んで終了します。
+
+        Args:
+            ring (SharedFrameRing): 画像の入力リングバッファ
+            result_queue (mp.Queue): 量子化結果の出力キュー
+            width (int): リサイズ後の横幅(0の場合はリサイズしません)
+            height (int): リサイズ後の縦幅(0の場合はリサイズしません)
+            interpolation (int): リサイズの補間方法
+            quantizer (FrameQuantizer): ワーカーごとの量子化処理
+            limit (Any, optional): WorkerTuner.shareで共有した有効なワーカー数(Noneの場合は常に有効). Defaults to None.
+            worker (int, optional): ワーカー番号. Defaults to 0.
+        """
+        try:
+            while True:
+                # 有効になるまで待機します。
+                if limit is not None:
+                    WorkerTuner.wait_shared(limit, worker)
+
+                # Noneを受け取るまで仕事をします。
+                if (values:=ring.get()) is None:
+                    break
+
+                frame, slot, shape, palette = values
+                start = time.perf_counter()
+                image = ring.view(slot, shape)
+                if width > 0:
+                    image = cv2.resize(image, (width, height), interpolation=interpolation)
+                values = quantizer.quantize(image, palette)
+                seconds = time.perf_counter() - start
+
+                # NOTE: 共有メモリを参照する画像を破棄してからスロットを返却します。
+                del image
+                ring.release(slot)
+
+                # 加工結果を送信します。
+                result_queue.put((frame, values, seconds))
+        except Exception:
+            # NOTE: 失敗したフレームは出力先に届かず書き込み側が待ち続けるため、受信スレッドに出力先を閉じさせます。
+            result_queue.put(False)
+        finally:
+            ring.detach()
+            result_queue.put(None)
+
+    @staticmethod
+    def update_process_result(
+        result_queue:mp.Queue,
+        output_queue:FrameReorderBuffer,
+        num_workers:int,
+        tuner:Optional[WorkerTuner] = None,
+    ) -> None:
+        """量子化プロセスの結果の受信
+
+        全てのプロセスから終了合図を受け取るまで、結果を出力先へ転送します。
+        プロセスから失敗(False)を受け取った場合は、出力先を閉じて変換を打ち切らせます。
+        NOTE: 共有メモリのスロットは量子化を終えた時点で空くため、他のプロセスは遅いフレームを追い越して先へ進みます。
+              範囲外の結果で転送を待機すると、後ろに届いた遅いフレームの結果を転送できずに書き込みが止まるため、
+              範囲外の結果は保留し、並び替え窓が進むたびに範囲内に入ったものから転送します。
+
+        Args:
+            result_queue (mp.Queue): 量子化結果の入力キュー
+            output_queue (FrameReorderBuffer): 画像の出力先
+            num_workers (int): 量子化処理のワーカー数
+            tuner (Optional[WorkerTuner], optional): 量子化の処理時間を記録する有効なワーカー数の自動調整. Defaults to None.
+        """
+        pending:dict[int, Any] = {}
+        while num_workers > 0 or (len(pending) > 0 and not output_queue.closed):
+            # 範囲内に入った保留中の結果をフレーム順に転送します。
+            for frame in sorted(pending):
+                if not output_queue.put((frame, pending[frame]), block=False):
+                    break
+                del pending[frame]
+
+            # NOTE: 保留中の結果がある場合は、窓の移動を確認するために一定間隔で受信を打ち切ります。
+            try:
+                values = result_queue.get(timeout=GIFConverter.PROCESS_RESULT_INTERVAL) if len(pending) > 0 else result_queue.get()
+            except queue.Empty:
+                continue
+            if values is None:
+                num_workers -= 1
+            elif values is False:
+                output_queue.close()
+            else:
+                frame, item, seconds = values
+                if tuner is not None:
+                    tuner.record(WorkerTuner.STAGE_QUANTIZE, seconds)
+                if not output_queue.put((frame, item), block=False):
+                    pending[frame] = item
 
     @staticmethod
     def update_image_scale_quantize(
-        input_queue:mp.Queue,
-        output_queue:mp.Queue,
+        input_queue:BoundedFrameQueue,
+        output_queue:FrameReorderBuffer,
         width:int,
         height:int,
         interpolation:int,
-        quantize_method:int,
-        quantize_kmeans:int,
+        quantizer:FrameQuantizer,
+        tuner:Optional[WorkerTuner] = None,
+        worker:int = 0,
+        tracer:Optional[PipelineTracer] = None,
     ) -> None:
         """画像のリサイズと量子化
 
-        処理された画像は出力キューに積まれます。
+        処理された画像はインデックス画像とパレットとして出力先に積まれます。
 
         Args:
-            input_queue (mp.Queue): 画像の入力キュー
-            output_queue (mp.Queue): 画像の出力キュー
+            input_queue (BoundedFrameQueue): 画像の入力キュー
+            output_queue (FrameReorderBuffer): 画像の出力先
             width (int): リサイズ後の横幅
             height (int): リサイズ後の縦幅
             interpolation (int): リサイズの補間方法
-            quantize_method (int): 量子化の種類
-            quantize_kmeans (int): クラスタ数
+            quantizer (FrameQuantizer): ワーカーごとの量子化処理
+            tuner (Optional[WorkerTuner], optional): 有効なワーカー数の自動調整. Defaults to None.
+            worker (int, optional): ワーカー番号. Defaults to 0.
+            tracer (Optional[PipelineTracer], optional): ステージごとの処理時間の記録. Defaults to None.
         """
+        if tracer is not None:
+            tracer.name_thread(f"quantize-{worker}")
+
         while True:
+            # 有効になるまで待機します.
+            start = time.perf_counter()
+            if tuner is not None:
+                tuner.wait(WorkerTuner.STAGE_QUANTIZE, worker)
+
             # Noneを受け取るまで仕事をします.
             if (values:=input_queue.get()) is None:
                 return
 
+            # 出力先が閉じられた場合は処理待ちの画像を破棄します.
+            if output_queue.closed:
+                continue
+
             # リサイズ後に量子化を行います.
-            frame, image = values
-            image = cv2.resize(image, (width, height), interpolation=interpolation)
-            image = GIFConverter.image_quantize(image, method=quantize_method, kmeans=quantize_kmeans)
+            frame, image, palette = values
+            resized = time.perf_counter()
+            try:
+                image = cv2.resize(image, (width, height), interpolation=interpolation)
+                quantized = time.perf_counter()
+                image = quantizer.quantize(image, palette)
+            except Exception:
+                # NOTE: 失敗したフレームは出力先に届かず書き込み側が待ち続けるため、出力先を閉じて打ち切らせます.
+                output_queue.close()
+                continue
+            end = time.perf_counter()
+            if tuner is not None:
+                tuner.record(WorkerTuner.STAGE_QUANTIZE, end - resized)
+            if tracer is not None:
+                tracer.add(PipelineTracer.STAGE_WAIT_GET, frame, start, resized)
+                tracer.add(PipelineTracer.STAGE_RESIZE, frame, resized, quantized)
+                tracer.add(PipelineTracer.STAGE_QUANTIZE, frame, quantized, end)
 
             # 加工結果を送信します.
             output_queue.put((frame, image))
 
     @staticmethod
     def update_image_quantize(
-        input_queue:mp.Queue,
-        output_queue:mp.Queue,
-        quantize_method:int,
-        quantize_kmeans:int,
+        input_queue:BoundedFrameQueue,
+        output_queue:FrameReorderBuffer,
+        quantizer:FrameQuantizer,
+        tuner:Optional[WorkerTuner] = None,
+        worker:int = 0,
+        tracer:Optional[PipelineTracer] = None,
     ) -> None:
         """画像の量子化
 
+        処理された画像はインデックス画像とパレットとして出力先に積まれます。
+
         Args:
-            input_queue (mp.Queue): 画像の入力キュー
-            output_queue (mp.Queue): 画像の出力キュー
-            quantize_method (int): 量子化の種類
-            quantize_kmeans (int): クラスタ数
+            input_queue (BoundedFrameQueue): 画像の入力キュー
+            output_queue (FrameReorderBuffer): 画像の出力先
+            quantizer (FrameQuantizer): ワーカーごとの量子化処理
+            tuner (Optional[WorkerTuner], optional): 有効なワーカー数の自動調整. Defaults to None.
+            worker (int, optional): ワーカー番号. Defaults to 0.
+            tracer (Optional[PipelineTracer], optional): ステージごとの処理時間の記録. Defaults to None.
         """
+        if tracer is not None:
+            tracer.name_thread(f"quantize-{worker}")
+
         while True:
+            # 有効になるまで待機します。
+            start = time.perf_counter()
+            if tuner is not None:
+                tuner.wait(WorkerTuner.STAGE_QUANTIZE, worker)
+
             # Noneを受け取るまで仕事をします。
             if (values:=input_queue.get()) is None:
                 return
 
+            # 出力先が閉じられた場合は処理待ちの画像を破棄します。
+            if output_queue.closed:
+                continue
+
             # 量子化を行います。
-            frame, image = values
-            image = GIFConverter.image_quantize(image, method=quantize_method, kmeans=quantize_kmeans)
+            frame, image, palette = values
+            quantized = time.perf_counter()
+            try:
+                image = quantizer.quantize(image, palette)
+            except Exception:
+                # NOTE: 失敗したフレームは出力先に届かず書き込み側が待ち続けるため、出力先を閉じて打ち切らせます。
+                output_queue.close()
+                continue
+            end = time.perf_counter()
+            if tuner is not None:
+                tuner.record(WorkerTuner.STAGE_QUANTIZE, end - quantized)
+            if tracer is not None:
+                tracer.add(PipelineTracer.STAGE_WAIT_GET, frame, start, quantized)
+                tracer.add(PipelineTracer.STAGE_QUANTIZE, frame, quantized, end)
 
             # 加工結果を送信します。
             output_queue.put((frame, image))
 
     @staticmethod
-    def image_quantize(
-        image:np.ndarray,
-        colors:int=256,
-        method:int=Image.Quantize.MEDIANCUT,
-        kmeans:int=0,
-        dither:int=Image.Dither.NONE,
-        mode:str="RGB",
-    ) -> Image.Image:
-        """画像の量子化
+    def load_images(path:Union[Path, str]) -> tuple[list[Image.Image], float]:
+        """GIFから量子化後のコールバック用の画像と表示時間を読込
+
+        表示時間が延長されたフレームは、最短の表示時間の画像が連続するよう複製します。
+
+        Args:
+            path (Union[Path, str]): GIFのパス
+
+        Returns:
+            tuple[list[Image.Image], float]: 画像と1枚あたりの表示時間(ミリ秒)
+        """
+        frames:list[tuple[Image.Image, float]] = []
+        with Image.open(path) as image:
+            for frame in ImageSequence.Iterator(image):
+                frames.append((frame.convert("RGB"), float(frame.info.get("duration", 0))))
+
+        duration = min([value for _, value in frames if value > 0.0], default=100.0)
+        images:list[Image.Image] = []
+        for frame, value in frames:
+            images.extend([frame] * max(1, round(value / duration)))
+        return images, duration
+
+    @staticmethod
+    def index_to_image(index:np.ndarray, palette:np.ndarray) -> Image.Image:
+        """インデックス画像とパレットから画像を作成
 
         Args:
-            image (np.ndarray): 入力画像(RGB配置を想定)
-            colors (int, optional): 減色後の色数. Defaults to 256.
-            method (int, optional): 量子化の種類. Defaults to Image.Quantize.MEDIANCUT.
-            kmeans (int, optional): クラスタ数. Defaults to 0.
-            dither (int, optional): ディザの種類. Defaults to Image.Dither.NONE.
-            mode (str, optional): 出力結果の形式. Defaults to "RGB".
+            index (np.ndarray): インデックス画像(H, W)
+            palette (np.ndarray): パレット(N, 3)
 
         Returns:
-            Image.Image: 量子化された画像
+            Image.Image: パレット形式の画像
         """
-        image:Image.Image = Image.fromarray(image, mode=mode)
-        if method != -1:
-            image = image.quantize(colors=colors, method=method, kmeans=kmeans, dither=dither)
-        return image.convert(mode)
+        image = Image.fromarray(index, mode="P")
+        image.putpalette(np.asarray(palette, dtype=np.uint8).tobytes())
+        return image
@@ -0,0 +1,451 @@
+from pathlib import Path
+import io
+import queue
+import threading as th
+import time
+from typing import Union, Optional, BinaryIO
+import numpy as np
+from PIL import Image
+from runtime.frame_queue import FrameReorderBuffer
+from runtime.pipeline_tracer import PipelineTracer
+from runtime.worker_tuner import WorkerTuner
+
+
+__all__ = [
+    "GIFWriter",
+]
+
+
+class GIFWriter:
+    """with対応なストリーミングGIF書き込み
+
+    フレームを受け取るたびにファイルへ追記するため、全フレームをメモリに保持しません。
+    ワーカー数を指定した場合は、フレームごとに独立したLZW圧縮をワーカースレッドで並列に行い、
+    圧縮済みのフレームをフレーム順に連結して書き込みます。
+    """
+    # 透過色なしで差分を書き込むことを表すインデックス
+    NO_TRANSPARENCY = -1
+
+    # ワーカー1つあたりの圧縮待ちのフレーム数
+    PENDING_FRAMES_PER_WORKER = 2
+
+    def __init__(
+        self,
+        filename:Union[Path, str, BinaryIO],
+        loop:int=0,
+        palette:Optional[np.ndarray]=None,
+        delta:bool=False,
+        num_workers:int=0,
+        tuner:Optional[WorkerTuner]=None,
+        tracer:Optional[PipelineTracer]=None,
+    ) -> None:
+        """コンストラクタ
+
+        Args:
+            filename (Union[Path, str, BinaryIO]): GIFの出力パス、又は書き込み先のファイルオブジェクト(閉じません)
+            loop (int, optional): ループ回数(0で無限). Defaults to 0.
+            palette (Optional[np.ndarray], optional): グローバルカラーテーブルに使用するパレット(N, 3). Defaults to None.
+            delta (bool, optional): 前フレームからの変化領域のみを書き込む場合はTrueを指定します. Defaults to False.
+            num_workers (int, optional): LZW圧縮のワーカー数(0以下で書き込み時に圧縮します). Defaults to 0.
+            tuner (Optional[WorkerTuner], optional): 有効なワーカー数の自動調整(Noneの場合は全てのワーカーが有効). Defaults to None.
+            tracer (Optional[PipelineTracer], optional): LZW圧縮の処理時間の記録. Defaults to None.
+        """
+        self.filename = str(filename) if isinstance(filename, (Path, str)) else filename
+        self.loop = loop
+        self.palette = None if palette is None else np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        self.delta = delta
+        self.num_workers = max(0, num_workers)
+        self.tuner = tuner
+        self.tracer = tracer
+        self.fp:Optional[BinaryIO] = None
+        self.canvas:Optional[np.ndarray] = None
+        self.encode_queue:Optional[queue.SimpleQueue] = None
+        self.output_queue:Optional[FrameReorderBuffer] = None
+        self.__frames = 0
+        self.__prepared = 0
+        self.__elapsed = 0.0
+
+    def __enter__(self) -> "GIFWriter":
+        self.fp = open(self.filename, "wb") if isinstance(self.filename, str) else self.filename
+        self.canvas = None
+        self.__frames = 0
+        self.__prepared = 0
+        self.__elapsed = 0.0
+
+        # LZW圧縮スレッドの立ち上げ
+        if self.num_workers > 0:
+            self.encode_queue = queue.SimpleQueue()
+            self.output_queue = FrameReorderBuffer(self.num_workers * self.PENDING_FRAMES_PER_WORKER)
+            for index in range(self.num_workers):
+                th.Thread(target=GIFWriter.update_encode, args=(self.encode_queue, self.output_queue, self.tuner, index, self.tracer), daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            # 正常終了時のみ圧縮待ちのフレームとトレーラーを書き込みます。
+            if exc_type is None:
+                while self.__frames < self.__prepared:
+                    self.write_encoded(*self.output_queue.get())
+                if self.__frames > 0:
+                    self.fp.write(b";")
+        finally:
+            # NOTE: 失敗、又は中止した場合は圧縮待ちのフレームを破棄し、圧縮スレッドを直ちに終了させます。
+            if exc_type is not None and self.encode_queue is not None:
+                self.output_queue.close()
+                while True:
+                    try:
+                        self.encode_queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+            # LZW圧縮スレッドの終了合図を送信
+            if self.encode_queue is not None:
+                for _ in range(self.num_workers):
+                    self.encode_queue.put(None)
+                self.encode_queue = None
+                self.output_queue = None
+            if isinstance(self.filename, str):
+                self.fp.close()
+            self.fp = None
+
+    @property
+    def frames(self) -> int:
+        """書き込み済みのフレーム数を取得
+
+        Returns:
+            int: 書き込み済みのフレーム数
+        """
+        return self.__frames
+
+    @property
+    def pending(self) -> float:
+        """圧縮待ちのフレームの割合を取得
+
+        Returns:
+            float: 圧縮待ちのフレーム数の並び替え窓に対する割合(0.0~1.0)、又は書き込み時に圧縮する場合は0.0
+        """
+        if self.output_queue is None:
+            return 0.0
+        return min(1.0, (self.__prepared - self.__frames) / self.output_queue.window)
+
+    @property
+    def elapsed(self) -> float:
+        """書き込み済みのフレームの合計表示時間を取得
+
+        Returns:
+            float: 合計表示時間(ミリ秒)
+        """
+        return self.__elapsed
+
+    def get_delay(self, duration:float) -> int:
+        """表示時間をGIFの遅延時間に変換
+
+        GIFの遅延時間は1/100秒単位のため、フレームごとに切り捨てると誤差が累積します。
+        そのため開始時刻と終了時刻をそれぞれ丸めた差を遅延時間とします。
+
+        Args:
+            duration (float): 表示時間(ミリ秒)
+
+        Returns:
+            int: 遅延時間(1/100秒)
+        """
+        start = round(self.__elapsed / 10.0)
+        self.__elapsed += duration
+        return min(0xFFFF, round(self.__elapsed / 10.0) - start)
+
+    @staticmethod
+    def o16(value:int) -> bytes:
+        """リトルエンディアンの16bit値に変換
+
+        Args:
+            value (int): 値
+
+        Returns:
+            bytes: 2byteの値
+        """
+        return int(value).to_bytes(2, "little")
+
+    @staticmethod
+    def get_color_table(palette:np.ndarray, entries:int=0) -> tuple[bytes, int]:
+        """カラーテーブルを取得
+
+        GIFのカラーテーブルは2のべき乗のエントリ数である必要があるため0で埋めます。
+
+        Args:
+            palette (np.ndarray): パレット(N, 3)
+            entries (int, optional): 最低限必要なエントリ数. Defaults to 0.
+
+        Returns:
+            tuple[bytes, int]: カラーテーブルとサイズフィールドの値
+        """
+        palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)[:256]
+        size = max(0, int(np.ceil(np.log2(max(2, len(palette), min(256, entries))))) - 1)
+        table = np.zeros((2 << size, 3), dtype=np.uint8)
+        table[:len(palette)] = palette
+        return table.tobytes(), size
+
+    @staticmethod
+    def encode_image_data(index:np.ndarray) -> bytes:
+        """インデックス画像のLZW圧縮
+
+        Args:
+            index (np.ndarray): インデックス画像(H, W)
+
+        Returns:
+            bytes: サブブロックに分割されたLZW圧縮データ(最小コードサイズと終端を含まない)
+        """
+        return Image.fromarray(np.ascontiguousarray(index, dtype=np.uint8), mode="L").tobytes("gif", "L")
+
+    @staticmethod
+    def get_delta(
+        canvas:np.ndarray,
+        image:np.ndarray,
+        index:np.ndarray,
+        entries:int,
+    ) -> tuple[int, int, np.ndarray, int]:
+        """前フレームからの変化領域を取得
+
+        変化した画素を囲む矩形を切り出し、矩形内で変化していない画素は透過色に置き換えます。
+        透過色には矩形内の変化した画素が使用していないインデックスを割り当てます。
+
+        Args:
+            canvas (np.ndarray): 前フレームまでの表示結果(H, W)
+            image (np.ndarray): 現フレームの表示結果(H, W)
+            index (np.ndarray): 現フレームのインデックス画像(H, W)
+            entries (int): 透過色に使用できるインデックスの上限
+
+        Returns:
+            tuple[int, int, np.ndarray, int]: 矩形の左端、上端、切り出したインデックス画像、透過色のインデックス
+        """
+        changed = image != canvas
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+
+        # 変化が無い場合は1画素の透過色のみを書き込みます。
+        if len(rows) == 0:
+            return 0, 0, np.zeros((1, 1), dtype=np.uint8), 0
+
+        top, bottom = rows[0], rows[-1] + 1
+        left, right = cols[0], cols[-1] + 1
+        index = index[top:bottom, left:right]
+        changed = changed[top:bottom, left:right]
+
+        if changed.all():
+            return left, top, index, GIFWriter.NO_TRANSPARENCY
+
+        # 変化した画素が使用していないインデックスを透過色にします。
+        unused = np.flatnonzero(np.bincount(index[changed], minlength=256)[:entries] == 0)
+        if len(unused) == 0:
+            return left, top, index, GIFWriter.NO_TRANSPARENCY
+
+        transparency = int(unused[0])
+        return left, top, np.where(changed, index, np.uint8(transparency)), transparency
+
+    @staticmethod
+    def update_encode(
+        encode_queue:queue.SimpleQueue,
+        output_queue:FrameReorderBuffer,
+        tuner:Optional[WorkerTuner]=None,
+        worker:int=0,
+        tracer:Optional[PipelineTracer]=None,
+    ) -> None:
+        """[Thread-N] フレームのLZW圧縮
+
+        NOTE: PillowのエンコーダーはGILを解放するため、スレッドで並列に圧縮できます。
+
+        Args:
+            encode_queue (queue.SimpleQueue): フレーム番号と、圧縮前の書き込み内容とインデックス画像の入力キュー
+            output_queue (FrameReorderBuffer): 圧縮前の書き込み内容と圧縮データの出力先
+            tuner (Optional[WorkerTuner], optional): 有効なワーカー数の自動調整. Defaults to None.
+            worker (int, optional): ワーカー番号. Defaults to 0.
+            tracer (Optional[PipelineTracer], optional): LZW圧縮の処理時間の記録. Defaults to None.
+        """
+        if tracer is not None:
+            tracer.name_thread(f"encode-{worker}")
+
+        while True:
+            # 有効になるまで待機します。
+            if tuner is not None:
+                tuner.wait(WorkerTuner.STAGE_ENCODE, worker)
+
+            # Noneを受け取るまで仕事をします。
+            if (values:=encode_queue.get()) is None:
+                return
+
+            frame, (prefix, index) = values
+            start = time.perf_counter()
+            data = GIFWriter.encode_image_data(index)
+            end = time.perf_counter()
+            if tuner is not None:
+                tuner.record(WorkerTuner.STAGE_ENCODE, end - start)
+            if tracer is not None:
+                tracer.add(PipelineTracer.STAGE_ENCODE, frame, start, end)
+            output_queue.put((frame, (prefix, data)))
+
+    def get_header(self, width:int, height:int) -> bytes:
+        """ヘッダーを取得
+
+        Args:
+            width (int): 画面の横幅
+            height (int): 画面の縦幅
+
+        Returns:
+            bytes: 論理画面記述子、グローバルカラーテーブル、ループ拡張
+        """
+        if self.palette is None:
+            header = b"GIF89a" + self.o16(width) + self.o16(height) + bytes([0, 0, 0])
+        else:
+            # グローバルカラーテーブル(色解像度は8bit)
+            color_table, size = self.get_color_table(self.palette)
+            header = b"GIF89a" + self.o16(width) + self.o16(height) + bytes([0xF0 | size, 0, 0]) + color_table
+
+        # NETSCAPE2.0 ループ拡張
+        return header + b"!\xff\x0bNETSCAPE2.0\x03\x01" + self.o16(self.loop) + b"\x00"
+
+    def write_header(self, width:int, height:int) -> None:
+        """ヘッダーの書き込み
+
+        Args:
+            width (int): 画面の横幅
+            height (int): 画面の縦幅
+        """
+        self.fp.write(self.get_header(width, height))
+
+    def write(self, index:np.ndarray, palette:np.ndarray, duration:float) -> None:
+        """フレームの書き込み
+
+        ワーカー数を指定した場合は圧縮をワーカースレッドへ渡し、圧縮済みのフレームから順に書き込みます。
+
+        Args:
+            index (np.ndarray): インデックス画像(H, W)
+            palette (np.ndarray): パレット(N, 3)
+            duration (float): 表示時間(ミリ秒)
+        """
+        prefix, index = self.prepare(index, palette, duration)
+        if self.encode_queue is None:
+            self.write_encoded(prefix, self.encode_image_data(index))
+            return
+
+        self.encode_queue.put((self.__prepared - 1, (prefix, index)))
+
+        # NOTE: 圧縮待ちのフレームは並び替え窓に収まる数までとし、溜まった分は順に書き込みます。
+        while self.__prepared - self.__frames >= self.output_queue.window:
+            self.write_encoded(*self.output_queue.get())
+
+    def prepare(self, index:np.ndarray, palette:np.ndarray, duration:float) -> tuple[bytes, np.ndarray]:
+        """フレームの画像データ以外の書き込み内容を作成
+
+        前フレームとの差分はフレーム順に求める必要があるため、書き込み順に呼び出します。
+
+        Args:
+            index (np.ndarray): インデックス画像(H, W)
+            palette (np.ndarray): パレット(N, 3)
+            duration (float): 表示時間(ミリ秒)
+
+        Returns:
+            tuple[bytes, np.ndarray]: 画像データより前の書き込み内容と、圧縮するインデックス画像
+        """
+        # 最初のフレームでヘッダーを書き込みます。
+        prefix = self.get_header(index.shape[1], index.shape[0]) if self.__prepared == 0 else b""
+
+        # NOTE: グローバルカラーテーブルと同じパレットの場合はローカルカラーテーブルを省略します。
+        is_global = self.palette is not None and (palette is self.palette or np.array_equal(palette, self.palette))
+
+        # 前フレームからの変化領域
+        left, top, transparency, disposal = 0, 0, self.NO_TRANSPARENCY, 0
+        if self.delta:
+            # NOTE: 前フレームを残したまま重ねて表示させます。
+            disposal = 1
+            # NOTE: 比較を1回で済ませるため、表示結果は24bitの色として保持します。
+            colors = np.asarray(palette, dtype=np.uint32).reshape(-1, 3)
+            image = ((colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2])[index]
+            if self.canvas is not None:
+                entries = 2 << self.get_color_table(self.palette)[1] if is_global else 256
+                left, top, index, transparency = self.get_delta(self.canvas, image, index, entries)
+            self.canvas = image
+        height, width = index.shape[:2]
+
+        # グラフィック制御拡張
+        flags = (disposal << 2) | (1 if transparency != self.NO_TRANSPARENCY else 0)
+        prefix += b"!\xf9\x04" + bytes([flags]) + self.o16(self.get_delay(duration)) + bytes([max(0, transparency), 0])
+
+        # イメージ記述子とローカルカラーテーブル
+        if is_global:
+            prefix += b"," + self.o16(left) + self.o16(top) + self.o16(width) + self.o16(height) + b"\x00"
+        else:
+            color_table, size = self.get_color_table(palette, transparency + 1)
+            prefix += b"," + self.o16(left) + self.o16(top) + self.o16(width) + self.o16(height) + bytes([0x80 | size])
+            prefix += color_table
+
+        self.__prepared += 1
+        return prefix, index
+
+    def write_encoded(self, prefix:bytes, data:bytes) -> None:
+        """圧縮済みのフレームの書き込み
+
+        Args:
+            prefix (bytes): 画像データより前の書き込み内容
+            data (bytes): LZW圧縮データ
+        """
+        self.fp.write(prefix + b"\x08" + data + b"\x00")
+        self.__frames += 1
+
+    @staticmethod
+    def retime(data:bytes, durations:list[float]) -> bytes:
+        """GIFの表示時間のみの書き換え
+
+        グラフィック制御拡張の遅延時間のみを書き換えるため、画像データの量子化や圧縮は行いません。
+        遅延時間は書き込み時と同じく開始時刻と終了時刻をそれぞれ丸めた差とします。
+
+        Args:
+            data (bytes): GIFのデータ
+            durations (list[float]): フレームごとの表示時間(ミリ秒)
+
+        Raises:
+            ValueError: GIFの構造が不正、又はグラフィック制御拡張の数が表示時間の数と異なる場合
+
+        Returns:
+            bytes: 表示時間を書き換えたGIFのデータ
+        """
+        data = bytearray(data)
+        if data[:6] not in (b"GIF87a", b"GIF89a") or len(data) < 13:
+            raise ValueError("invalid gif header")
+
+        def skip_sub_blocks(position:int) -> int:
+            """サブブロックの終端の次の位置を取得"""
+            while (size:=data[position]) != 0:
+                position += size + 1
+            return position + 1
+
+        # NOTE: 遅延時間の丸め誤差の累積を書き込み時と揃えるため、書き込みと同じ計算で求めます。
+        writer = GIFWriter(io.BytesIO())
+        delays = iter([writer.get_delay(duration) for duration in durations])
+
+        # 論理画面記述子とグローバルカラーテーブル
+        position = 13
+        if data[10] & 0x80:
+            position += 3 << ((data[10] & 0x07) + 1)
+
+        try:
+            while (block:=data[position]) != 0x3B:
+                if block == 0x21:
+                    # グラフィック制御拡張の遅延時間を書き換えます。
+                    if data[position + 1] == 0xF9:
+                        data[position + 4:position + 6] = GIFWriter.o16(next(delays))
+                    position = skip_sub_blocks(position + 2)
+                elif block == 0x2C:
+                    # イメージ記述子、ローカルカラーテーブル、LZW最小コードサイズを読み飛ばします。
+                    flags = data[position + 9]
+                    position += 10
+                    if flags & 0x80:
+                        position += 3 << ((flags & 0x07) + 1)
+                    position = skip_sub_blocks(position + 1)
+                else:
+                    raise ValueError(f"invalid gif block: {block:#x}")
+        except (IndexError, StopIteration) as e:
+            raise ValueError("gif does not match durations") from e
+
+        if next(delays, None) is not None:
+            raise ValueError("gif does not match durations")
+
+        return bytes(data)
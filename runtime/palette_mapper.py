@@ -0,0 +1,240 @@
+import hashlib
+import threading as th
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+
+__all__ = [
+    "PaletteMapper",
+]
+
+
+class PaletteMapper:
+    """パレットの作成と、パレットへの画素の割り当て
+    """
+    # 最近傍探索で一度に処理する画素数
+    CHUNK_PIXELS = 1 << 16
+
+    # ルックアップテーブルの1チャンネルあたりのビット数
+    LUT_BITS = 6
+
+    # キャッシュするルックアップテーブルの数
+    LUT_CACHE_SIZE = 16
+
+    # 組織的ディザの閾値行列の大きさ
+    BAYER_SIZE = 8
+
+    # パレットのハッシュをキーとしたルックアップテーブルのキャッシュ
+    lut_cache:OrderedDict[bytes, np.ndarray] = OrderedDict()
+    lut_lock = th.Lock()
+    # 作成中のルックアップテーブルのキーと、作成完了の通知
+    lut_building:dict[bytes, th.Event] = {}
+
+    @staticmethod
+    def build(
+        pixels:np.ndarray,
+        colors:int=256,
+        method:int=Image.Quantize.MEDIANCUT,
+        kmeans:int=0,
+    ) -> np.ndarray:
+        """画素の集合からパレットを作成
+
+        Args:
+            pixels (np.ndarray): 画素(N, 3)
+            colors (int, optional): パレットの色数. Defaults to 256.
+            method (int, optional): 量子化の種類. Defaults to Image.Quantize.MEDIANCUT.
+            kmeans (int, optional): クラスタ数. Defaults to 0.
+
+        Returns:
+            np.ndarray: パレット(colors, 3)
+        """
+        # NOTE: Pillowの量子化を使用するため、画素を縦1列の画像として扱います。
+        image = Image.fromarray(np.ascontiguousarray(pixels, dtype=np.uint8).reshape(-1, 1, 3), mode="RGB")
+        image = image.quantize(colors=colors, method=method, kmeans=kmeans, dither=Image.Dither.NONE)
+        return np.asarray(image.getpalette("RGB"), dtype=np.uint8).reshape(-1, 3)[:colors]
+
+    @staticmethod
+    def nearest(colors:np.ndarray, palette:np.ndarray) -> np.ndarray:
+        """色を最も近いパレットの色に割り当て
+
+        距離の計算は |p - c|^2 = |p|^2 - 2p・c + |c|^2 の展開を行列積でまとめて行い、
+        最近傍の判定に影響しない |p|^2 は省略しています。
+
+        Args:
+            colors (np.ndarray): 色(N, 3)
+            palette (np.ndarray): パレット(M, 3)
+
+        Returns:
+            np.ndarray: パレットのインデックス(N,)
+        """
+        weights = -2.0 * palette.astype(np.float32).T
+        norms = (palette.astype(np.float32) ** 2).sum(axis=1)
+
+        index = np.empty(len(colors), dtype=np.uint8)
+        for start in range(0, len(colors), PaletteMapper.CHUNK_PIXELS):
+            distances = colors[start:start + PaletteMapper.CHUNK_PIXELS].astype(np.float32) @ weights
+            distances += norms
+            index[start:start + len(distances)] = np.argmin(distances, axis=1)
+
+        return index
+
+    @staticmethod
+    def map_exact(image:np.ndarray, palette:np.ndarray) -> np.ndarray:
+        """画素を最も近いパレットの色に割り当て
+
+        動画の画素は色の重複が多いため、重複を除いた色についてのみ最近傍を求めます。
+
+        Args:
+            image (np.ndarray): 入力画像(H, W, 3)
+            palette (np.ndarray): パレット(N, 3)
+
+        Returns:
+            np.ndarray: インデックス画像(H, W)
+        """
+        pixels = image.reshape(-1, 3)
+
+        # 24bitの色へまとめて重複を除きます。
+        keys = (pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        colors = np.stack([keys >> 16, (keys >> 8) & 0xFF, keys & 0xFF], axis=1)
+
+        return PaletteMapper.nearest(colors, palette)[inverse].reshape(image.shape[:2])
+
+    @staticmethod
+    def build_lut(palette:np.ndarray, bits:int) -> np.ndarray:
+        """色空間のルックアップテーブルを作成
+
+        RGBの各チャンネルを上位bitsビットに量子化した立方体の各セルについて、
+        セル中心に最も近いパレットのインデックスを求めます。
+
+        Args:
+            palette (np.ndarray): パレット(N, 3)
+            bits (int): 1チャンネルあたりのビット数
+
+        Returns:
+            np.ndarray: ルックアップテーブル(2^(3*bits),)
+        """
+        shift = 8 - bits
+        levels = (np.arange(1 << bits, dtype=np.uint32) << shift) + ((1 << shift) >> 1)
+        r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+        return PaletteMapper.nearest(np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1), palette)
+
+    @staticmethod
+    def get_lut(palette:np.ndarray) -> np.ndarray:
+        """キャッシュからルックアップテーブルを取得
+
+        キャッシュに無い場合は作成し、上限を超えた場合は最も長く使われていないものから破棄します。
+        NOTE: 作成はロックの外で行い、同じパレットを作成中の場合のみ完了を待つため、異なるパレットの作成や取得を妨げません。
+
+        Args:
+            palette (np.ndarray): パレット(N, 3)
+
+        Returns:
+            np.ndarray: ルックアップテーブル(2^(3*LUT_BITS),)
+        """
+        key = hashlib.blake2b(np.ascontiguousarray(palette, dtype=np.uint8).tobytes(), digest_size=16).digest()
+        while True:
+            with PaletteMapper.lut_lock:
+                if (lut:=PaletteMapper.lut_cache.get(key)) is not None:
+                    PaletteMapper.lut_cache.move_to_end(key)
+                    return lut
+                building = PaletteMapper.lut_building.get(key)
+                if building is None:
+                    building = PaletteMapper.lut_building[key] = th.Event()
+                    break
+
+            # NOTE: 同じパレットを他のワーカーが作成中の場合は、完了を待ってからキャッシュを引き直します。
+            #       作成に失敗した場合はキャッシュに無いため、待っていたワーカーが作成し直します。
+            building.wait()
+
+        lut = None
+        try:
+            lut = PaletteMapper.build_lut(palette, PaletteMapper.LUT_BITS)
+        finally:
+            with PaletteMapper.lut_lock:
+                if lut is not None:
+                    PaletteMapper.lut_cache[key] = lut
+                    while len(PaletteMapper.lut_cache) > PaletteMapper.LUT_CACHE_SIZE:
+                        PaletteMapper.lut_cache.popitem(last=False)
+                del PaletteMapper.lut_building[key]
+            building.set()
+        return lut
+
+    @staticmethod
+    def map(image:np.ndarray, palette:np.ndarray) -> np.ndarray:
+        """画素をパレットの色に割り当て
+
+        パレットごとにキャッシュしたルックアップテーブルを引くだけのため、
+        同じパレットを使い回すフレームでは最近傍探索を行いません。
+
+        Args:
+            image (np.ndarray): 入力画像(H, W, 3)
+            palette (np.ndarray): パレット(N, 3)
+
+        Returns:
+            np.ndarray: インデックス画像(H, W)
+        """
+        lut = PaletteMapper.get_lut(palette)
+
+        bits, shift = PaletteMapper.LUT_BITS, 8 - PaletteMapper.LUT_BITS
+        keys = (image[..., 0] >> shift).astype(np.uint32) << (bits * 2)
+        keys |= (image[..., 1] >> shift).astype(np.uint32) << bits
+        keys |= image[..., 2] >> shift
+        return lut[keys]
+
+    @staticmethod
+    def build_bayer(size:int) -> np.ndarray:
+        """Bayer行列の作成
+
+        Args:
+            size (int): 行列の大きさ(2のべき乗)
+
+        Returns:
+            np.ndarray: 0からsize^2-1までの値を持つ閾値行列(size, size)
+        """
+        matrix = np.zeros((1, 1), dtype=np.int32)
+        while len(matrix) < size:
+            matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+        return matrix
+
+    @staticmethod
+    def dither_ordered(image:np.ndarray, strength:float) -> np.ndarray:
+        """組織的ディザ(Bayer)の適用
+
+        画素の位置ごとに決まった閾値を加算するため、画素ごとに独立して並列に処理でき、
+        同じ色の領域はフレーム間で同じ模様になります。
+        適用後の画像をパレットへ割り当てることで、パレットの色の間の階調を模様で表現します。
+
+        Args:
+            image (np.ndarray): 入力画像(H, W, 3)
+            strength (float): 閾値の振れ幅(画素値)
+
+        Returns:
+            np.ndarray: 閾値を加算した画像(H, W, 3)
+        """
+        matrix = PaletteMapper.build_bayer(PaletteMapper.BAYER_SIZE)
+        # NOTE: 切り捨てでは0付近の閾値が0に偏り振れ幅が対称でなくなるため、四捨五入します。
+        offset = np.rint(((matrix + 0.5) / matrix.size - 0.5) * strength)
+        height, width = image.shape[:2]
+        offset = np.tile(offset.astype(np.int16), (-(-height // len(matrix)), -(-width // len(matrix))))[:height, :width]
+        return np.clip(image.astype(np.int16) + offset[..., None], 0, 255).astype(np.uint8)
+
+    @staticmethod
+    def map_floyd_steinberg(image:np.ndarray, palette:np.ndarray) -> np.ndarray:
+        """誤差拡散ディザ(Floyd-Steinberg)による画素のパレットの色への割り当て
+
+        割り当ての誤差を周囲の未処理の画素へ拡散するため画素ごとに独立して処理できず、
+        ルックアップテーブルを使わずにPillowでパレットへ変換します。
+
+        Args:
+            image (np.ndarray): 入力画像(H, W, 3)
+            palette (np.ndarray): パレット(N, 3)
+
+        Returns:
+            np.ndarray: インデックス画像(H, W)
+        """
+        palette_image = Image.new("P", (1, 1))
+        palette_image.putpalette(np.ascontiguousarray(palette, dtype=np.uint8).tobytes())
+        image = Image.fromarray(np.ascontiguousarray(image, dtype=np.uint8), mode="RGB")
+        return np.asarray(image.quantize(palette=palette_image, dither=Image.Dither.FLOYDSTEINBERG))
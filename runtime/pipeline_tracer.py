@@ -0,0 +1,141 @@
+from pathlib import Path
+import json
+import os
+import threading as th
+import time
+from typing import Union, Optional, Any
+
+
+__all__ = [
+    "PipelineTracer",
+]
+
+
+class PipelineTracer:
+    """パイプラインのステージごとの処理時間の記録
+
+    フレームごと、ステージごと、スレッドごとの開始と終了の時刻を記録し、
+    Chrome/Perfettoのトレースイベント形式のJSONと、ステージとスレッドごとの集計表として出力します。
+    記録はリストへの追加のみのため、複数のスレッドから呼び出せます。
+    NOTE: 記録しない場合はトレーサーをNoneとし、呼び出し側で判定することで計測の負荷をほぼ無くします。
+    """
+    # ステージ
+    STAGE_DECODE = "decode"
+    STAGE_CONVERT = "convert"
+    STAGE_RESIZE = "resize"
+    STAGE_SCENE = "scene"
+    STAGE_QUANTIZE = "quantize"
+    STAGE_ENCODE = "encode"
+    STAGE_WRITE = "write"
+    STAGE_SAVE = "save"
+
+    # キューの待機(書き込み側が空きを待つput、取り出し側が到着を待つget)
+    STAGE_WAIT_PUT = "wait_put"
+    STAGE_WAIT_GET = "wait_get"
+
+    def __init__(self) -> None:
+        """コンストラクタ
+        """
+        self.origin = time.perf_counter()
+        self.events:list[tuple[str, int, int, float, float]] = []
+        self.thread_names:dict[int, str] = {}
+
+    def add(self, stage:str, frame:int, start:float, end:Optional[float]=None) -> None:
+        """処理時間の記録
+
+        Args:
+            stage (str): ステージ
+            frame (int): フレーム番号(フレームに紐付かない場合は-1)
+            start (float): 開始時刻(time.perf_counter)
+            end (Optional[float], optional): 終了時刻(time.perf_counter、Noneの場合は現在時刻). Defaults to None.
+        """
+        self.events.append((stage, frame, th.get_ident(), start, time.perf_counter() if end is None else end))
+
+    def name_thread(self, name:str) -> None:
+        """呼び出したスレッドの表示名を登録
+
+        Args:
+            name (str): 表示名
+        """
+        self.thread_names[th.get_ident()] = name
+
+    def get_trace(self) -> dict[str, Any]:
+        """トレースイベント形式のデータを取得
+
+        Returns:
+            dict[str, Any]: chrome://tracingやPerfettoで読み込めるトレースイベント
+        """
+        pid = os.getpid()
+        events:list[dict[str, Any]] = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self.thread_names.items()
+        ]
+        for stage, frame, tid, start, end in list(self.events):
+            events.append({
+                "name": stage,
+                "cat": "pipeline",
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": {"frame": frame},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path:Union[Path, str]) -> None:
+        """トレースイベント形式のJSONを出力
+
+        Args:
+            path (Union[Path, str]): 出力パス
+        """
+        with open(path, "w") as fp:
+            json.dump(self.get_trace(), fp)
+
+    def get_summary(self) -> dict[str, dict[str, dict[str, float]]]:
+        """ステージとスレッドごとの集計を取得
+
+        スレッドの稼働率は、記録の開始から最後の記録までの時間に対する待機以外の処理時間の割合です。
+
+        Returns:
+            dict[str, dict[str, dict[str, float]]]: stagesにステージごとの回数、合計、平均、最大時間(秒)、
+                                                    threadsにスレッドごとの処理時間、待機時間(秒)と稼働率
+        """
+        events = list(self.events)
+        wall = max([end for *_, end in events], default=self.origin) - self.origin
+
+        stages:dict[str, dict[str, float]] = {}
+        threads:dict[str, dict[str, float]] = {}
+        for stage, _, tid, start, end in events:
+            seconds = end - start
+            values = stages.setdefault(stage, {"count": 0, "total": 0.0, "mean": 0.0, "max": 0.0})
+            values["count"] += 1
+            values["total"] += seconds
+            values["max"] = max(values["max"], seconds)
+
+            name = self.thread_names.get(tid, str(tid))
+            values = threads.setdefault(name, {"busy": 0.0, "wait": 0.0, "utilization": 0.0})
+            values["wait" if stage in (self.STAGE_WAIT_PUT, self.STAGE_WAIT_GET) else "busy"] += seconds
+
+        for values in stages.values():
+            values["mean"] = values["total"] / values["count"]
+        for values in threads.values():
+            values["utilization"] = values["busy"] / wall if wall > 0.0 else 0.0
+
+        return {"stages": stages, "threads": threads}
+
+    def format_summary(self) -> str:
+        """集計表を文字列で取得
+
+        Returns:
+            str: ステージごとの集計表とスレッドごとの集計表
+        """
+        summary = self.get_summary()
+        lines = [f"{'stage':<12}{'count':>8}{'total(ms)':>12}{'mean(ms)':>12}{'max(ms)':>12}"]
+        for stage, values in sorted(summary["stages"].items(), key=lambda item: item[1]["total"], reverse=True):
+            lines.append(f"{stage:<12}{values['count']:>8}{values['total'] * 1e3:>12.1f}{values['mean'] * 1e3:>12.2f}{values['max'] * 1e3:>12.2f}")
+        lines.append("")
+        lines.append(f"{'thread':<12}{'busy(ms)':>12}{'wait(ms)':>12}{'util(%)':>10}")
+        for name, values in sorted(summary["threads"].items()):
+            lines.append(f"{name:<12}{values['busy'] * 1e3:>12.1f}{values['wait'] * 1e3:>12.1f}{values['utilization'] * 100:>10.1f}")
+        return "\n".join(lines)
@@ -0,0 +1,101 @@
+from typing import Optional
+import cv2
+import numpy as np
+from runtime.frame_quantizer import FrameQuantizer
+
+
+__all__ = [
+    "SceneDetector",
+]
+
+
+class SceneDetector:
+    """シーン切り替えの検出とショットごとのパレット
+
+    同じショット内のフレームは色の分布がほぼ変わらないため、ショットの先頭フレームから作成した
+    パレットを使い回します。縮小画像の色ヒストグラムをショットの先頭フレームと比較し、
+    距離が閾値を超えた場合はシーンが切り替わったとみなしてパレットを作り直します。
+    フレーム順に呼び出す必要があるため、動画読込スレッドで使用します。
+    """
+    # ヒストグラムを求める縮小画像のサイズ
+    HISTOGRAM_SIZE = (64, 36)
+
+    # 1チャンネルあたりのヒストグラムのビン数
+    HISTOGRAM_BINS = 8
+
+    # パレットの作成に使用する画素数
+    PALETTE_SAMPLE_PIXELS = 1 << 16
+
+    def __init__(self, threshold:float, quantize_method:int, quantize_kmeans:int, colors:int=256) -> None:
+        """コンストラクタ
+
+        Args:
+            threshold (float): シーンが切り替わったとみなすヒストグラムの距離(0.0~1.0)
+            quantize_method (int): 量子化の種類
+            quantize_kmeans (int): クラスタ数
+            colors (int, optional): パレットの色数. Defaults to 256.
+        """
+        self.threshold = threshold
+        self.quantize_method = quantize_method
+        self.quantize_kmeans = quantize_kmeans
+        self.colors = colors
+
+        # ショットの先頭フレームのヒストグラムとパレット
+        self.histogram:Optional[np.ndarray] = None
+        self.palette:Optional[np.ndarray] = None
+
+        # 検出したショット数
+        self.shots = 0
+
+    @staticmethod
+    def get_histogram(image:np.ndarray) -> np.ndarray:
+        """縮小画像の色ヒストグラムを取得
+
+        Args:
+            image (np.ndarray): 入力画像(H, W, 3)
+
+        Returns:
+            np.ndarray: 合計が1になるよう正規化したヒストグラム(HISTOGRAM_BINS^3,)
+        """
+        image = cv2.resize(image, SceneDetector.HISTOGRAM_SIZE, interpolation=cv2.INTER_AREA)
+        bins = SceneDetector.HISTOGRAM_BINS
+        histogram = cv2.calcHist([image], [0, 1, 2], None, [bins, bins, bins], [0, 256, 0, 256, 0, 256]).ravel()
+        return histogram / max(1.0, float(histogram.sum()))
+
+    @staticmethod
+    def get_distance(histogram:np.ndarray, other:np.ndarray) -> float:
+        """ヒストグラムの距離を取得
+
+        Args:
+            histogram (np.ndarray): ヒストグラム
+            other (np.ndarray): 比較対象のヒストグラム
+
+        Returns:
+            float: 全変動距離(0.0で一致、1.0で重なり無し)
+        """
+        return 0.5 * float(np.abs(histogram - other).sum())
+
+    def get_palette(self, image:np.ndarray) -> np.ndarray:
+        """ショットのパレットを取得
+
+        シーンが切り替わった場合は、新しいショットのパレットを作成します。
+
+        Args:
+            image (np.ndarray): 入力画像(H, W, 3)
+
+        Returns:
+            np.ndarray: パレット(N, 3)
+        """
+        histogram = self.get_histogram(image)
+        if self.histogram is not None and self.get_distance(histogram, self.histogram) <= self.threshold:
+            return self.palette
+
+        # NOTE: 毎回同じ位置の画素から作成するよう、乱数は固定のシードで初期化します。
+        pixels = image.reshape(-1, 3)
+        rng = np.random.default_rng(0)
+        pixels = pixels[rng.choice(len(pixels), min(len(pixels), self.PALETTE_SAMPLE_PIXELS), replace=False)]
+
+        self.histogram = histogram
+        self.palette = FrameQuantizer.build_palette(pixels, self.quantize_method, self.quantize_kmeans, self.colors)
+        self.shots += 1
+        return self.palette
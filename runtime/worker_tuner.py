@@ -0,0 +1,197 @@
+import os
+import threading as th
+import time
+from typing import Optional, Any
+
+
+__all__ = [
+    "WorkerTuner",
+]
+
+
+class WorkerTuner:
+    """ステージごとのワーカー数の自動調整
+
+    量子化(リサイズを含む)とLZW圧縮のワーカーはそれぞれコア数分を立ち上げておき、有効なワーカーのみが仕事を受け取ります。
+    有効なワーカー数は、ワーカーが計測した1フレームあたりの処理時間に各ステージの処理待ちの割合を加味して
+    動画読込の分を除いたコア数を配分し直すため、最も遅いステージに最も多くのワーカーが割り当てられます。
+    NOTE: デコードと色空間の変換は読込スレッドの1つに固定され、配分の対象外です(DECODE_CPUSの分を確保するのみです)。
+    NOTE: 量子化をプロセスで行う場合は、有効なワーカー数を共有メモリで共有し(share)、処理時間は親プロセスで記録します。
+    """
+    # ステージ
+    STAGE_QUANTIZE = "quantize"
+    STAGE_ENCODE = "encode"
+    STAGES = (STAGE_QUANTIZE, STAGE_ENCODE)
+
+    # 計測前の1フレームあたりの処理時間の比
+    INITIAL_WEIGHTS = {STAGE_QUANTIZE: 4.0, STAGE_ENCODE: 1.0}
+
+    # 動画読込に確保するコア数
+    DECODE_CPUS = 1
+
+    # 配分し直す間隔(秒)
+    INTERVAL = 0.2
+
+    # 他プロセスのワーカーが有効になったかを確認する間隔(秒)
+    SHARED_INTERVAL = 0.01
+
+    # 終了時に共有する、全てのワーカーを有効にするワーカー数
+    SHARED_CLOSED = 1 << 30
+
+    def __init__(self, cpus:int) -> None:
+        """コンストラクタ
+
+        Args:
+            cpus (int): 使用できるコア数
+        """
+        self.cpus = max(1, cpus)
+        self.budget = max(len(self.STAGES), self.cpus - self.DECODE_CPUS)
+        self.limits = self.allocate(self.budget, self.INITIAL_WEIGHTS)
+        self.times = {stage: 0.0 for stage in self.STAGES}
+        self.counts = {stage: 0 for stage in self.STAGES}
+        self.closed = False
+        self.updated = time.perf_counter()
+        self.__shared:dict[str, Any] = {}
+        self.__condition = th.Condition()
+
+    @staticmethod
+    def get_cpu_count() -> int:
+        """使用できるコア数を取得
+
+        Returns:
+            int: CPUアフィニティで制限されている場合は、制限後のコア数を返します。
+        """
+        try:
+            return max(1, len(os.sched_getaffinity(0)))
+        except AttributeError:
+            return max(1, os.cpu_count() or 1)
+
+    @staticmethod
+    def allocate(budget:int, weights:dict[str, float]) -> dict[str, int]:
+        """重みに比例したワーカー数の配分
+
+        各ステージに最低1つを割り当て、残りは重みに比例して最大剰余方式で配分します。
+
+        Args:
+            budget (int): 配分するワーカー数
+            weights (dict[str, float]): ステージごとの重み
+
+        Returns:
+            dict[str, int]: ステージごとのワーカー数
+        """
+        total = sum(weights.values())
+        remain = max(0, budget - len(weights))
+        if total <= 0.0:
+            shares = {stage: remain / len(weights) for stage in weights}
+        else:
+            shares = {stage: remain * weight / total for stage, weight in weights.items()}
+
+        limits = {stage: 1 + int(share) for stage, share in shares.items()}
+        for stage in sorted(shares, key=lambda stage: shares[stage] - int(shares[stage]), reverse=True)[:budget - sum(limits.values())]:
+            limits[stage] += 1
+        return limits
+
+    def get_limit(self, stage:str) -> int:
+        """有効なワーカー数を取得
+
+        Args:
+            stage (str): ステージ
+
+        Returns:
+            int: 有効なワーカー数
+        """
+        return self.limits[stage]
+
+    def wait(self, stage:str, index:int) -> None:
+        """ワーカーが有効になるまで待機
+
+        Args:
+            stage (str): ステージ
+            index (int): ステージ内のワーカー番号
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.closed or index < self.limits[stage])
+
+    def share(self, stage:str, value:Any) -> None:
+        """有効なワーカー数を他プロセスと共有
+
+        配分し直すたびに共有メモリ上の値を更新し、他プロセスのワーカーはwait_sharedで待機します。
+
+        Args:
+            stage (str): ステージ
+            value (Any): 共有メモリ上の整数(multiprocessingのValue、又はRawValue)
+        """
+        with self.__condition:
+            self.__shared[stage] = value
+            value.value = self.SHARED_CLOSED if self.closed else self.limits[stage]
+
+    @staticmethod
+    def wait_shared(value:Any, index:int) -> None:
+        """[Process-N] 他プロセスと共有した有効なワーカー数で、ワーカーが有効になるまで待機
+
+        NOTE: プロセス間ではConditionで通知できないため、一定間隔で確認します。
+
+        Args:
+            value (Any): shareで共有した共有メモリ上の整数
+            index (int): ステージ内のワーカー番号
+        """
+        while index >= value.value:
+            time.sleep(WorkerTuner.SHARED_INTERVAL)
+
+    def record(self, stage:str, seconds:float) -> None:
+        """1フレームの処理時間を記録
+
+        Args:
+            stage (str): ステージ
+            seconds (float): 処理時間(秒)
+        """
+        with self.__condition:
+            self.times[stage] += seconds
+            self.counts[stage] += 1
+
+    def update(self, depths:dict[str, float]) -> None:
+        """有効なワーカー数の配分し直し
+
+        前回から間隔が空いていない場合は何もしないため、フレームごとに呼び出せます。
+
+        Args:
+            depths (dict[str, float]): ステージごとの処理待ちの割合(0.0~1.0)
+        """
+        now = time.perf_counter()
+        if now - self.updated < self.INTERVAL:
+            return
+        self.updated = now
+
+        with self.__condition:
+            # NOTE: 計測した処理時間と計測前の比は単位が異なり比べられないため、全てのステージを計測するまでは計測前の比を使います。
+            if all(self.counts[stage] > 0 for stage in self.STAGES):
+                weights = {stage: self.times[stage] / self.counts[stage] for stage in self.STAGES}
+            else:
+                weights = dict(self.INITIAL_WEIGHTS)
+
+            # NOTE: 処理待ちが溜まっているステージは処理が追いついていないため、重みを最大2倍にします。
+            for stage in self.STAGES:
+                weights[stage] *= 1.0 + min(1.0, max(0.0, depths.get(stage, 0.0)))
+
+            self.limits = self.allocate(self.budget, weights)
+            for stage, value in self.__shared.items():
+                value.value = self.limits[stage]
+            self.__condition.notify_all()
+
+    def close(self) -> None:
+        """全てのワーカーを有効にして終了合図を受け取れるようにする
+        """
+        with self.__condition:
+            self.closed = True
+            for value in self.__shared.values():
+                value.value = self.SHARED_CLOSED
+            self.__condition.notify_all()
+
+    def get_summary(self) -> dict[str, Optional[float]]:
+        """ステージごとの1フレームあたりの平均処理時間を取得
+
+        Returns:
+            dict[str, Optional[float]]: 平均処理時間(秒)、又は計測していない場合はNone
+        """
+        with self.__condition:
+            return {stage: self.times[stage] / self.counts[stage] if self.counts[stage] > 0 else None for stage in self.STAGES}